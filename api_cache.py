@@ -0,0 +1,82 @@
+import time
+import threading
+from cloudshell.api.common_cloudshell_api import CloudShellAPIError
+
+
+# ErrorCode CloudShell answers with when the session's token is no longer valid, e.g. after a server restart
+EXPIRED_SESSION_CODES = ('100',)
+
+
+def _is_expired(error):
+    return str(getattr(error, 'code', '')) in EXPIRED_SESSION_CODES
+
+
+class ReconnectingSession(object):
+    """
+    Proxy of a cached CloudShellAPISession that logs in again and retries once when the session expired
+    """
+
+    def __init__(self, cache, key, session):
+        self._cache = cache
+        self._key = key
+        self._session = session
+
+    def __getattr__(self, name):
+        attr = getattr(self._session, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                return getattr(self._session, name)(*args, **kwargs)
+            except CloudShellAPIError, e:
+                if not _is_expired(e):
+                    raise
+                self._session = self._cache.login(self._key)
+                return getattr(self._session, name)(*args, **kwargs)
+        return call
+
+
+class APISessionCache(object):
+    """
+    CloudShell API sessions shared per (server address, token) and decrypted passwords kept in memory for a while,
+    so consecutive commands don't pay the login and DecryptPassword round trips again
+    """
+
+    def __init__(self, factory, credential_ttl=600):
+        """
+        :param factory: CloudShellAPISession class (or any callable with its arguments)
+        """
+        self.factory = factory
+        self.credential_ttl = credential_ttl
+        self._sessions = {}
+        self._credentials = {}
+        self._lock = threading.Lock()
+
+    def login(self, key):
+        server_address, token, domain = key
+        return self.factory(server_address, token_id=token, domain=domain)
+
+    def get(self, server_address, token, domain='Global'):
+        key = (server_address, token, domain)
+        with self._lock:
+            if key in self._sessions:
+                return self._sessions[key]
+        # Log in without holding the lock, so a slow server doesn't hold up commands of other reservations
+        session = ReconnectingSession(self, key, self.login(key))
+        with self._lock:
+            return self._sessions.setdefault(key, session)
+
+    def decrypt(self, session, server_address, encrypted):
+        """
+        :return: the decrypted password, from memory when it was decrypted less than credential_ttl seconds ago
+        """
+        key = (server_address, encrypted)
+        with self._lock:
+            entry = self._credentials.get(key)
+            if entry and time.time() - entry[0] < self.credential_ttl:
+                return entry[1]
+        password = session.DecryptPassword(encrypted).Value
+        with self._lock:
+            self._credentials[key] = (time.time(), password)
+        return password
@@ -0,0 +1,213 @@
+"""
+Runs the driver commands against simulated iDRACs (fake_idrac.py) and reports throughput and latency percentiles
+per command and fleet size, with a local stub standing in for the CloudShell API
+
+    python benchmarks/bench_driver.py [--hosts 1,10,100,500] [--commands os,firmware,power,disks,password]
+                                      [--latency MS] [--jitter MS] [--error-rate R] [--drop-rate R] [--workers N]
+                                      [--fleet]
+
+--fleet sends each command through run_on_fleet, which reads every host's channel on one event loop, instead of
+calling the command on a thread per host
+"update" runs update_firmware as well; it is left out by default because the driver waits 30 seconds for the
+reboot, so its latency is mostly that wait
+The simulated iDRACs run in a child process so they don't compete with the driver for the interpreter lock
+Logs and metrics the driver writes go to a temporary directory
+"""
+import os
+import re
+import sys
+import copy
+import time
+import tempfile
+import argparse
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+os.chdir(tempfile.mkdtemp(prefix='bench-driver-'))
+import driver
+from api_cache import APISessionCache
+from fleet import FleetExecutor, HostResult
+from fake_idrac import USER, PASSWORD, loopback_addresses
+
+# --commands name -> (driver command, its arguments after the context)
+COMMANDS = {
+    'os': ('get_running_os', ()),
+    'firmware': ('get_firmware', ('bios',)),
+    'power': ('power_control', ('status',)),
+    'disks': ('get_disks', ()),
+    'password': ('change_root_password', ('calvin',)),
+    'update': ('update_firmware', ('bios',)),
+}
+
+
+class Value(object):
+    def __init__(self, value):
+        self.Value = value
+
+
+class StubAPI(object):
+    """
+    Answers the CloudShell API calls the driver makes, without a server
+    """
+
+    def __init__(self, password):
+        self.password = password
+        self.messages = 0
+        # Resource name -> (address, attributes), for run_on_fleet
+        self.resources = {}
+
+    def DecryptPassword(self, encrypted):
+        return Value(self.password)
+
+    def WriteMessageToReservationOutput(self, reservation_id, message):
+        self.messages += 1
+
+    def SetAttributeValue(self, resource, name, value):
+        pass
+
+    def GetResourceDetails(self, name):
+        address, attributes = self.resources[name]
+        return Namespace(Address=address, ResourceAttributes=[Namespace(Name='DellLifecycle.' + attr, Value=value)
+                                                              for attr, value in attributes.items()])
+
+
+class Context(object):
+    """
+    The parts of a ResourceCommandContext the driver reads
+    """
+
+    def __init__(self, name, address, attributes):
+        self.connectivity = Namespace(admin_auth_token='token', server_address='localhost')
+        self.resource = Namespace(name=name, address=address, attributes=attributes, model='DellLifecycle')
+        self.reservation = Namespace(reservation_id='benchmark')
+
+
+class Namespace(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[int(round(percent / 100.0 * (len(ordered) - 1)))]
+
+
+def start_server(args, hosts):
+    """
+    Start fake_idrac.py and wait until it listens
+    """
+    server = subprocess.Popen([sys.executable, os.path.join(HERE, 'fake_idrac.py'), '--hosts', str(hosts),
+                               '--address', args.address, '--port', str(args.port),
+                               '--latency', str(args.latency), '--jitter', str(args.jitter),
+                               '--error-rate', str(args.error_rate), '--drop-rate', str(args.drop_rate)],
+                              stdout=subprocess.PIPE)
+    if not server.stdout.readline().startswith('Serving'):
+        server.wait()
+        raise Exception("fake_idrac.py didn't start")
+    return server
+
+
+def make_drivers(addresses, port, sysinfo_ttl):
+    attributes = {
+        'User': USER,
+        'Password': 'encrypted',
+        'SSH Port': str(port),
+        'Sysinfo Cache TTL': sysinfo_ttl,
+    }
+    drivers = {}
+    for index, address in enumerate(addresses):
+        context = Context('idrac-%03d' % index, address, dict(attributes))
+        instance = driver.DellLifecycleDriver()
+        instance.initialize(context)
+        drivers[address] = (instance, context)
+    return drivers
+
+
+def bench(drivers, command, workers):
+    method, args = COMMANDS[command]
+
+    def run(address):
+        instance, context = drivers[address]
+        getattr(instance, method)(context, *args)
+        return ''
+
+    start = time.time()
+    results = FleetExecutor(workers, host_timeout=900).run(sorted(drivers), run)
+    wall = time.time() - start
+    latencies = [result.elapsed for result in results if result.ok]
+    failed = [result for result in results if not result.ok]
+    return wall, latencies, failed
+
+
+def bench_fleet(drivers, command, workers):
+    """
+    Run the command on every host with one run_on_fleet call and read the per-host results from its report
+    """
+    method, args = COMMANDS[command]
+    instance, context = drivers[sorted(drivers)[0]]
+    fleet = copy.copy(instance)
+    fleet.attrs = dict(instance.attrs, **{'Fleet Max Workers': str(workers)})
+    fleet._captured = []
+    names = [drivers[address][1].resource.name for address in sorted(drivers)]
+    start = time.time()
+    fleet.run_on_fleet(context, ','.join(names), command, args[0] if args else '')
+    wall = time.time() - start
+    report = fleet._captured[-1]
+    latencies, failed = [], []
+    for host, status, elapsed, output in re.findall(r'^--- (\S+) (OK|FAILED) \(([\d.]+)s\)\n(.*)$', report, re.M):
+        if status == 'OK':
+            latencies.append(float(elapsed))
+        else:
+            failed.append(HostResult(host, False, output, float(elapsed)))
+    return wall, latencies, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the driver against simulated iDRACs")
+    parser.add_argument('--hosts', default='1,10,100', help="comma separated fleet sizes, up to 500")
+    parser.add_argument('--commands', default='os,firmware,power,disks,password')
+    parser.add_argument('--workers', type=int, default=64, help="hosts driven at once")
+    parser.add_argument('--address', default='127.0.1.1', help="first loopback address")
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--latency', type=float, default=50, help="milliseconds per reply")
+    parser.add_argument('--jitter', type=float, default=20, help="+- milliseconds per reply")
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--drop-rate', type=float, default=0)
+    parser.add_argument('--sysinfo-ttl', default='0', help="seconds, 0 sends every getsysinfo to the iDRAC")
+    parser.add_argument('--fleet', action='store_true', help="run the commands through run_on_fleet")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.hosts.split(',')]
+    commands = [command.strip() for command in args.commands.split(',')]
+    for command in commands:
+        if command not in COMMANDS:
+            parser.error("unknown command: " + command)
+        if args.fleet and command not in driver.DellLifecycleDriver.FLEET_OPERATIONS:
+            parser.error("run_on_fleet has no operation: " + command)
+
+    server = start_server(args, max(sizes))
+    addresses = loopback_addresses(args.address, max(sizes))
+    stub = StubAPI(PASSWORD)
+    driver.api_sessions = APISessionCache(lambda *login_args, **login_kwargs: stub)
+    print '{0:>9} {1:>5} {2:>4} {3:>8} {4:>10} {5:>8} {6:>8}'.format(
+        'command', 'hosts', 'fail', 'wall s', 'hosts/s', 'p50 s', 'p99 s')
+    try:
+        for size in sizes:
+            drivers = make_drivers(addresses[:size], args.port, args.sysinfo_ttl)
+            for instance, context in drivers.values():
+                stub.resources[context.resource.name] = (context.resource.address, context.resource.attributes)
+            for command in commands:
+                wall, latencies, failed = (bench_fleet if args.fleet else bench)(drivers, command, args.workers)
+                print '{0:>9} {1:>5} {2:>4} {3:8.2f} {4:10.1f} {5:8.3f} {6:8.3f}'.format(
+                    command, size, len(failed), wall, len(latencies) / wall,
+                    percentile(latencies, 50) if latencies else 0, percentile(latencies, 99) if latencies else 0)
+                for result in failed[:3]:
+                    print '          ' + result.host + ': ' + (result.output.strip().splitlines() or [''])[-1]
+            driver.ssh_pool.close_all()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
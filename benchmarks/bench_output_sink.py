@@ -0,0 +1,53 @@
+"""
+Compares writing reservation output one API call per message with the coalescing OutputSink,
+against a local stub of the CloudShell API that answers after a fixed latency
+
+    python benchmarks/bench_output_sink.py [messages] [latency_ms]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from output_sink import OutputSink
+
+
+class StubAPI(object):
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.lines = []
+
+    def WriteMessageToReservationOutput(self, reservation_id, message):
+        time.sleep(self.latency)
+        self.calls += 1
+        self.lines.extend(message.split('\n'))
+
+
+def direct(api, messages):
+    for message in messages:
+        api.WriteMessageToReservationOutput('reservation', message)
+
+
+def coalesced(api, messages):
+    sink = OutputSink(lambda message: api.WriteMessageToReservationOutput('reservation', message))
+    for message in messages:
+        sink.add(message)
+    sink.flush()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.02
+    messages = ['Job JID_%012d Status: Running (%d%%)' % (x, x % 100) for x in xrange(count)]
+    for name, run in (('direct', direct), ('coalesced', coalesced)):
+        api = StubAPI(latency)
+        start = time.time()
+        run(api, messages)
+        elapsed = time.time() - start
+        assert api.lines == messages, name + " changed the order of the messages"
+        print '{0:10} {1:5} messages {2:5} API calls {3:8.3f}s'.format(name, count, api.calls, elapsed)
+
+
+if __name__ == '__main__':
+    main()
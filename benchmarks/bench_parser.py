@@ -0,0 +1,89 @@
+"""
+Microbenchmark of racadm_parser against the split() parsing the driver used before, on recorded replies
+scaled up to large controllers
+
+    python benchmarks/bench_parser.py [bays] [repeat]
+"""
+import os
+import re
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import racadm_parser
+
+
+def fixture(name):
+    with open(os.path.join(HERE, 'fixtures', name), 'rb') as f:
+        return f.read()
+
+
+def scale_pdisks(text, bays):
+    """
+    Repeat the recorded bays until the reply lists the given number of them
+    """
+    head, prompt = text.split('\r\n', 1)[0], text.rsplit('\r\n', 1)[1]
+    blocks = re.findall(r'Disk\.Bay\.\d+:.*?(?=\r\nDisk\.Bay\.|\r\n' + re.escape(prompt) + ')', text, re.S)
+    out = [head]
+    for bay in xrange(bays):
+        out.append(re.sub(r'^Disk\.Bay\.\d+', 'Disk.Bay.%d' % bay, blocks[bay % len(blocks)]))
+    return '\r\n'.join(out) + '\r\n' + prompt
+
+
+def legacy_pdisks(out):
+    rst = out.split('Disk.Bay.')
+    disk_names = []
+    disk_sizes = []
+    for disk in rst:
+        if (disk != '\n') and ('racadm' not in disk):
+            disk_name = disk.split('Name                             = ')[1].split('\r\n')[0]
+            disk_size = disk.split('Size                             = ')[1].split('\r\n')[0]
+            disk_names.append(disk_name)
+            disk_sizes.append(disk_size)
+    return disk_names, disk_sizes
+
+
+def legacy_job_status(out, job_id):
+    for job in out.split('Job ID'):
+        if job_id in job:
+            return (job.split('Message=')[1]).split('\n')[0], (job.split('Status=')[1]).split('\n')[0]
+
+
+def streamed_pdisks(text, chunk=9999):
+    parser = racadm_parser.pdisk_parser()
+    disks = []
+    for start in xrange(0, len(text), chunk):
+        disks.extend(parser.feed(text[start:start + chunk]))
+    return disks + parser.close()
+
+
+def bench(name, func, repeat):
+    best = min(timeit.repeat(func, number=repeat, repeat=3)) / repeat
+    print '{0:40} {1:10.1f} us'.format(name, best * 1e6)
+
+
+def main():
+    bays = int(sys.argv[1]) if len(sys.argv) > 1 else 48
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    pdisks = scale_pdisks(fixture('pdisks.txt'), bays)
+    jobs = fixture('jobqueue.txt')
+    sysinfo = fixture('getsysinfo.txt')
+
+    names, sizes = legacy_pdisks(pdisks)
+    parsed = racadm_parser.parse_pdisks(pdisks)
+    assert [disk.name for disk in parsed] == names and [disk.size for disk in parsed] == sizes
+    assert streamed_pdisks(pdisks, 1024) == parsed
+
+    print '{0} bays, {1} bytes'.format(bays, len(pdisks))
+    bench('pdisks legacy split', lambda: legacy_pdisks(pdisks), repeat)
+    bench('pdisks parse_pdisks', lambda: racadm_parser.parse_pdisks(pdisks), repeat)
+    bench('pdisks streamed (9999 byte chunks)', lambda: streamed_pdisks(pdisks), repeat)
+    bench('jobqueue legacy split', lambda: legacy_job_status(jobs, 'JID_469210554734'), repeat)
+    bench('jobqueue parse_jobs + job_status',
+          lambda: racadm_parser.job_status(racadm_parser.parse_jobs(jobs), 'JID_469210554734'), repeat)
+    bench('getsysinfo parse_sysinfo', lambda: racadm_parser.parse_sysinfo(sysinfo), repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+"""
+Simulated iDRACs for benchmarking the driver without hardware: a paramiko SSH server listening on one loopback
+address per host, answering racadm commands with the recorded replies in fixtures/ after a configurable latency
+
+    python benchmarks/fake_idrac.py [--hosts N] [--port P] [--latency MS] [--jitter MS] [--error-rate R] [--drop-rate R]
+
+Firmware updates are simulated: "racadm update" queues a job that reports Downloading, then Scheduled, and
+completes with a bumped version on the next power cycle
+"""
+import os
+import re
+import sys
+import time
+import random
+import socket
+import struct
+import argparse
+import threading
+import paramiko
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROMPT = '/admin1-> '
+# Prompt of the interactive shell a bare "racadm" opens, where commands go without the racadm prefix
+RACADM_PROMPT = 'racadm>>'
+BANNER = 'Connecting to 127.0.0.1:22...\r\n\r\n'
+JOB_HEADER = '---------------------------- JOB -------------------------'
+JOB_FOOTER = '----------------------------------------------------------'
+JOB_STATES = {
+    'Downloading': ('RED003: Downloading package.', '0'),
+    'Scheduled': ('JCP001: Task successfully scheduled.', '34'),
+    'Completed': ('RED001: Job completed successfully.', '100'),
+}
+ERROR_REPLY = 'ERROR: RAC1171: Unable to complete the operation. Retry the operation.'
+UNKNOWN_REPLY = 'ERROR: Invalid subcommand specified.'
+USER = 'root'
+PASSWORD = 'calvin'
+
+
+def fixture_body(name):
+    """
+    A recorded reply without its echoed command line and trailing prompt
+    """
+    with open(os.path.join(HERE, 'fixtures', name), 'rb') as f:
+        text = f.read()
+    return text.split('\r\n', 1)[1].rsplit('\r\n', 1)[0]
+
+
+def loopback_addresses(first, count):
+    start = struct.unpack('!I', socket.inet_aton(first))[0]
+    return [socket.inet_ntoa(struct.pack('!I', start + x)) for x in xrange(count)]
+
+
+def _bump(version):
+    parts = version.split('.')
+    parts[-1] = str(int(parts[-1]) + 1) if parts[-1].isdigit() else parts[-1] + '1'
+    return '.'.join(parts)
+
+
+class FakeHost(object):
+    """
+    State of one simulated iDRAC: its versions and the firmware jobs it was given
+    """
+    VERSION_FIELDS = {'bios.EXE': 'System BIOS Version', 'idrac.EXE': 'Firmware Version'}
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.lock = threading.Lock()
+        self.fields = {}
+        self.jobs = []
+        self.power = 'ON'
+
+    def answer(self, command):
+        words = command.split()
+        if not words:
+            return ''
+        if words[0] != 'racadm':
+            return UNKNOWN_REPLY
+        verb = ' '.join(words[1:3])
+        with self.lock:
+            if words[1:2] == ['getsysinfo']:
+                return self._sysinfo()
+            if verb == 'raid get' and len(words) > 3:
+                return self.replies.get(words[3], UNKNOWN_REPLY)
+            if verb == 'jobqueue view':
+                return self._jobqueue(words[4] if len(words) > 4 else None)
+            if words[1:2] == ['serveraction'] and len(words) > 2:
+                return self._serveraction(words[2])
+            if words[1:2] == ['update']:
+                return self._update(command)
+            if words[1:2] == ['set']:
+                return 'Object value modified successfully'
+        return UNKNOWN_REPLY
+
+    def _sysinfo(self):
+        text = self.replies['getsysinfo']
+        for field, value in self.fields.items():
+            text = re.sub(r'(' + re.escape(field) + r'\s*= )\S+', lambda m: m.group(1) + value, text)
+        return text
+
+    def _jobqueue(self, job_id):
+        blocks = self.replies['jobs'] + [self._job_block(job) for job in self.jobs]
+        if job_id is None:
+            return '\r\n'.join(blocks)
+        for job in self.jobs:
+            if job['id'] == job_id:
+                block = self._job_block(job)
+                # Each poll moves a download on, like the iDRAC finishing it in the background
+                if job['status'] == 'Downloading':
+                    job['status'] = 'Scheduled'
+                return block
+        for block in self.replies['jobs']:
+            if '[Job ID=' + job_id + ']' in block:
+                return block
+        return 'ERROR: SUP033: Unable to find the specified job ID: ' + job_id
+
+    def _job_block(self, job):
+        message, percent = JOB_STATES[job['status']]
+        return '\r\n'.join([JOB_HEADER, '[Job ID=' + job['id'] + ']', 'Job Name=' + job['name'],
+                            'Status=' + job['status'], 'Start Time=[Now]', 'Expiration Time=[Not Applicable]',
+                            'Message=[' + message + ']', 'Percent Complete=[' + percent + ']', JOB_FOOTER])
+
+    def _update(self, command):
+        image = re.search(r'-f\s+(\S+)', command)
+        image = image.group(1) if image else ''
+        field = self.VERSION_FIELDS.get(image)
+        if field is None:
+            return 'ERROR: RAC947: Invalid file name: ' + image
+        job_id = 'JID_%012d' % random.randint(0, 10 ** 12 - 1)
+        name = 'Firmware Update: ' + ('BIOS' if image == 'bios.EXE' else 'iDRAC')
+        self.jobs.append({'id': job_id, 'name': name, 'status': 'Downloading', 'field': field})
+        return 'RAC987: Firmware update job for ' + image + ' is initiated.\r\n' \
+               'This firmware update job may take several minutes to complete depending on the component or ' \
+               'firmware being updated.\r\nTo view the progress of the job, use the "racadm jobqueue view" command.'
+
+    def _serveraction(self, action):
+        if action == 'powerstatus':
+            return re.sub(r'\S+$', self.power, self.replies['powerstatus'])
+        if action not in ('powerup', 'powerdown', 'powercycle', 'hardreset'):
+            return UNKNOWN_REPLY
+        self.power = 'OFF' if action == 'powerdown' else 'ON'
+        if action in ('powercycle', 'hardreset'):
+            for job in self.jobs:
+                if job['status'] != 'Completed':
+                    job['status'] = 'Completed'
+                    current = re.search(re.escape(job['field']) + r'\s*= (\S+)', self._sysinfo()).group(1)
+                    self.fields[job['field']] = _bump(current)
+        return self.replies['poweraction']
+
+
+class _Shell(paramiko.ServerInterface):
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self.shell = threading.Event()
+
+    def check_auth_password(self, username, password):
+        if username == self.user and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.shell.set()
+        return True
+
+
+class FakeIDRACServer(object):
+    """
+    Serves hosts simulated iDRACs, one per loopback address starting at first_address
+    Every reply waits latency +- jitter seconds; error_rate of the commands get a racadm error instead of their
+    reply and drop_rate of them close the connection without answering
+    """
+
+    def __init__(self, hosts=1, first_address='127.0.1.1', port=2222, user=USER, password=PASSWORD,
+                 latency=0.05, jitter=0.0, error_rate=0.0, drop_rate=0.0, seed=None):
+        self.addresses = loopback_addresses(first_address, hosts)
+        self.port = port
+        self.user = user
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.key = paramiko.RSAKey.generate(2048)
+        replies = {
+            'getsysinfo': fixture_body('getsysinfo.txt'),
+            'vdisks': fixture_body('vdisks.txt'),
+            'pdisks': fixture_body('pdisks.txt'),
+            'powerstatus': fixture_body('serveraction_powerstatus.txt'),
+            'poweraction': fixture_body('serveraction_powercycle.txt'),
+            'jobs': [JOB_HEADER + block for block in fixture_body('jobqueue.txt').split(JOB_HEADER)[1:]],
+        }
+        replies['jobs'] = [block.rstrip('\r\n') for block in replies['jobs']]
+        self.hosts = dict((address, FakeHost(replies)) for address in self.addresses)
+        self.commands = 0
+        self._listeners = []
+        self._transports = set()
+        self._running = False
+
+    def start(self):
+        for address in self.addresses:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((address, self.port))
+            listener.listen(64)
+            listener.settimeout(0.5)
+            self._listeners.append(listener)
+        self._running = True
+        # A thread per listener, since select() can't watch descriptors past FD_SETSIZE
+        for listener in self._listeners:
+            thread = threading.Thread(target=self._accept, args=(listener,))
+            thread.daemon = True
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for listener in self._listeners:
+            listener.close()
+        self._listeners = []
+        for transport in list(self._transports):
+            transport.close()
+        # Let the connection threads notice, so none is left running into interpreter shutdown
+        deadline = time.time() + 2
+        while self._transports and time.time() < deadline:
+            time.sleep(0.05)
+
+    def _accept(self, listener):
+        address = listener.getsockname()[0]
+        while self._running:
+            try:
+                sock, peer = listener.accept()
+            except socket.timeout:
+                continue
+            except socket.error:
+                return
+            sock.settimeout(None)
+            thread = threading.Thread(target=self._serve, args=(sock, address))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock, address):
+        transport = paramiko.Transport(sock)
+        self._transports.add(transport)
+        transport.add_server_key(self.key)
+        shell = _Shell(self.user, self.password)
+        try:
+            transport.start_server(server=shell)
+            host = self.hosts[address]
+            while transport.is_active():
+                chan = transport.accept(0.5)
+                if chan is None:
+                    continue
+                thread = threading.Thread(target=self._session, args=(transport, chan, shell, host))
+                thread.daemon = True
+                thread.start()
+        except (paramiko.SSHException, EOFError, socket.error):
+            return
+        finally:
+            self._transports.discard(transport)
+
+    def _session(self, transport, chan, shell, host):
+        shell.shell.wait(10)
+        try:
+            chan.sendall(BANNER + PROMPT)
+            pending = ''
+            interactive = [False]
+            while True:
+                data = chan.recv(4096)
+                if not data:
+                    return
+                pending += data.replace('\r\n', '\n').replace('\r', '\n')
+                while '\n' in pending:
+                    line, pending = pending.split('\n', 1)
+                    if not self._reply(transport, chan, host, line.strip(), interactive):
+                        return
+        except (socket.error, EOFError, paramiko.SSHException):
+            return
+        finally:
+            chan.close()
+
+    def _reply(self, transport, chan, host, command, interactive):
+        """
+        :param list interactive: one flag, True while the channel is in the racadm shell
+        :return: False when the connection was dropped on purpose
+        """
+        self.commands += 1
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        roll = self.random.random()
+        if roll < self.drop_rate:
+            transport.close()
+            return False
+        if command == 'racadm' and not interactive[0]:
+            interactive[0] = True
+            reply = ''
+        elif command == 'exit' and interactive[0]:
+            interactive[0] = False
+            reply = ''
+        elif roll < self.drop_rate + self.error_rate:
+            reply = ERROR_REPLY
+        else:
+            reply = host.answer('racadm ' + command if interactive[0] else command)
+        prompt = RACADM_PROMPT if interactive[0] else PROMPT
+        chan.sendall(command + '\r\n' + (reply + '\r\n' if reply else '') + prompt)
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve simulated iDRACs until interrupted")
+    parser.add_argument('--hosts', type=int, default=1)
+    parser.add_argument('--address', default='127.0.1.1', help="first loopback address")
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--latency', type=float, default=50, help="milliseconds per reply")
+    parser.add_argument('--jitter', type=float, default=0, help="+- milliseconds per reply")
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--drop-rate', type=float, default=0)
+    args = parser.parse_args()
+    server = FakeIDRACServer(args.hosts, args.address, args.port, latency=args.latency / 1000,
+                             jitter=args.jitter / 1000, error_rate=args.error_rate, drop_rate=args.drop_rate).start()
+    print 'Serving ' + str(args.hosts) + ' iDRACs on ' + server.addresses[0] + '-' + server.addresses[-1] + \
+          ':' + str(args.port) + ' (user ' + server.user + ', password ' + server.password + ')'
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Simulated iDRAC Redfish API for running RedfishClient and the driver's Redfish backend without hardware: a plain
+HTTP server answering the resources the client reads from a dict, which tests can change or break
+
+    python benchmarks/fake_redfish.py [--port P]
+
+Point a resource's "Redfish URL" attribute at the printed URL to use it
+"""
+import json
+import base64
+import socket
+import argparse
+import threading
+import SocketServer
+import BaseHTTPServer
+
+USER = 'root'
+PASSWORD = 'calvin'
+SYSTEM = '/redfish/v1/Systems/System.Embedded.1'
+MANAGER = '/redfish/v1/Managers/iDRAC.Embedded.1'
+ACCOUNT = '/redfish/v1/AccountService/Accounts/2'
+STORAGE = SYSTEM + '/Storage/RAID.Integrated.1-1'
+# ComputerSystem.Reset type -> PowerState afterwards
+RESETS = {'On': 'On', 'ForceOff': 'Off', 'PowerCycle': 'On', 'ForceRestart': 'On', 'GracefulShutdown': 'Off'}
+
+
+def default_resources():
+    """
+    :return: path -> JSON document, a string is sent as is (e.g. to break the JSON)
+    """
+    drives = ['Disk.Bay.0:Enclosure.Internal.0-1:RAID.Integrated.1-1',
+              'Disk.Bay.1:Enclosure.Internal.0-1:RAID.Integrated.1-1']
+    resources = {
+        SYSTEM: {'BiosVersion': '2.4.3', 'Model': 'PowerEdge R730', 'SKU': '8XJ3PC2', 'PowerState': 'On',
+                 'HostName': 'esx01'},
+        MANAGER: {'FirmwareVersion': '2.30.30.30'},
+        SYSTEM + '/Storage': {'Members': [{'@odata.id': STORAGE}]},
+        STORAGE: {'Drives': [{'@odata.id': STORAGE + '/Drives/' + drive} for drive in drives],
+                  'Volumes': {'@odata.id': STORAGE + '/Volumes'}},
+        STORAGE + '/Volumes': {'Members': [{'@odata.id': STORAGE + '/Volumes/Disk.Virtual.0:RAID.Integrated.1-1'}]},
+        STORAGE + '/Volumes/Disk.Virtual.0:RAID.Integrated.1-1': {'Name': 'Virtual Disk 0', 'RAIDType': 'RAID1',
+                                                                 'CapacityBytes': 599550590976},
+        MANAGER + '/Jobs/JID_469210554734': {'Id': 'JID_469210554734', 'JobState': 'Scheduled',
+                                             'Message': 'Task successfully scheduled.'},
+    }
+    for x, drive in enumerate(drives):
+        resources[STORAGE + '/Drives/' + drive] = {'Name': 'Physical Disk 0:1:' + str(x), 'CapacityBytes': 599550590976}
+    return resources
+
+
+class FakeRedfishServer(object):
+    """
+    One simulated iDRAC on 127.0.0.1, with basic authentication, power actions and password changes
+    """
+
+    def __init__(self, port=0, user=USER, password=PASSWORD):
+        self.user = user
+        self.password = password
+        self.resources = default_resources()
+        # (method, path, body) of every authenticated request
+        self.requests = []
+        self.lock = threading.Lock()
+        self._connections = set()
+        self._server = _Server(('127.0.0.1', port), _Handler)
+        self._server.fake = self
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:' + str(self._server.server_address[1])
+
+    def start(self):
+        thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.1})
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        # Keep-alive connections would otherwise hold their handler threads until the client goes away
+        with self.lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except socket.error:
+                    pass
+
+    def answer(self, method, path, body):
+        """
+        :return: (HTTP status, JSON document or None)
+        """
+        with self.lock:
+            self.requests.append((method, path, body))
+            if method == 'GET':
+                if path not in self.resources:
+                    return 404, {'error': {'message': 'Resource not found: ' + path}}
+                return 200, self.resources[path]
+            if method == 'POST' and path == SYSTEM + '/Actions/ComputerSystem.Reset':
+                if body.get('ResetType') not in RESETS:
+                    return 400, {'error': {'message': 'Invalid ResetType'}}
+                self.resources[SYSTEM]['PowerState'] = RESETS[body['ResetType']]
+                return 204, None
+            if method == 'PATCH' and path == ACCOUNT and 'Password' in body:
+                self.password = body['Password']
+                return 200, {}
+        return 405, {'error': {'message': method + ' not allowed on ' + path}}
+
+
+class _Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Keep-alive, like the iDRAC, so the client's pooled sessions are exercised
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.fake.lock:
+            self.server.fake._connections.add(self.connection)
+
+    def finish(self):
+        with self.server.fake.lock:
+            self.server.fake._connections.discard(self.connection)
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+        except socket.error:
+            pass
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+    def _handle(self, method):
+        fake = self.server.fake
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else ''
+        if self.headers.get('Authorization') != 'Basic ' + base64.b64encode(fake.user + ':' + fake.password):
+            return self._reply(401, {'error': {'message': 'Unauthorized'}})
+        try:
+            body = json.loads(data) if data else {}
+        except ValueError:
+            return self._reply(400, {'error': {'message': 'Malformed JSON'}})
+        self._reply(*fake.answer(method, self.path, body))
+
+    def _reply(self, status, document):
+        text = '' if document is None else document if isinstance(document, basestring) else json.dumps(document)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a simulated iDRAC Redfish API until interrupted")
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = FakeRedfishServer(args.port).start()
+    print 'Serving Redfish on ' + server.url + ' (user ' + server.user + ', password ' + server.password + ')'
+    try:
+        while True:
+            threading.Event().wait(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
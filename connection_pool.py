@@ -0,0 +1,120 @@
+import time
+import threading
+import paramiko
+
+
+class SSHConnectionPool(object):
+    """
+    Keeps authenticated SSH clients per (address, user) so driver commands can reuse them
+    instead of doing a full handshake every time
+    """
+
+    def __init__(self, max_per_host=2, idle_timeout=300, keepalive=30, connect_timeout=30):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self._idle = {}
+        self._in_use = {}
+        self._lock = threading.Condition()
+
+    def acquire(self, address, user, password, port=22, timeout=None):
+        """
+        Get a live client for the host, opening a new one only when none is idle
+        :return: paramiko.SSHClient
+        """
+        key = (address, port, user)
+        timeout = timeout if timeout is not None else self.connect_timeout
+        deadline = time.time() + timeout
+        with self._lock:
+            while True:
+                self._evict_idle()
+                idle = self._idle.get(key, [])
+                while idle:
+                    client, last_used = idle.pop()
+                    if self._is_healthy(client):
+                        self._in_use[key] = self._in_use.get(key, 0) + 1
+                        return client
+                    self._close(client)
+                if self._in_use.get(key, 0) < self.max_per_host:
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception("Timed out waiting for a free SSH connection to: " + address)
+                self._lock.wait(remaining)
+        try:
+            return self._connect(address, port, user, password)
+        except Exception:
+            with self._lock:
+                self._in_use[key] -= 1
+                self._lock.notify_all()
+            raise
+
+    def release(self, client, address, user, port=22, broken=False):
+        """
+        Hand a client back to the pool, closing it if it is broken or no longer healthy
+        """
+        key = (address, port, user)
+        with self._lock:
+            self._in_use[key] = max(self._in_use.get(key, 0) - 1, 0)
+            if broken or not self._is_healthy(client):
+                self._close(client)
+            else:
+                self._idle.setdefault(key, []).append((client, time.time()))
+            self._lock.notify_all()
+
+    def discard(self, address, user, port=22):
+        """
+        Close every idle client of the host, e.g. after the iDRAC was reset
+        """
+        with self._lock:
+            for client, last_used in self._idle.pop((address, port, user), []):
+                self._close(client)
+
+    def close_all(self):
+        with self._lock:
+            for clients in self._idle.values():
+                for client, last_used in clients:
+                    self._close(client)
+            self._idle = {}
+
+    def _connect(self, address, port, user, password):
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # allow auto-accepting new hosts
+        ssh.connect(address, port, username=user, password=password, timeout=self.connect_timeout,
+                    look_for_keys=False, allow_agent=False)
+        ssh.get_transport().set_keepalive(self.keepalive)
+        return ssh
+
+    def _evict_idle(self):
+        now = time.time()
+        for key in self._idle.keys():
+            keep = []
+            for client, last_used in self._idle[key]:
+                if now - last_used > self.idle_timeout:
+                    self._close(client)
+                else:
+                    keep.append((client, last_used))
+            if keep:
+                self._idle[key] = keep
+            else:
+                del self._idle[key]
+
+    @staticmethod
+    def _is_healthy(client):
+        transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _close(client):
+        try:
+            client.close()
+        except:
+            pass
@@ -1,18 +1,144 @@
 import time
 import re
-import paramiko
+import copy
+import functools
+import select
+import uuid
 from distutils.version import LooseVersion
 from cloudshell.shell.core.resource_driver_interface import ResourceDriverInterface
 from cloudshell.shell.core.context import InitCommandContext, ResourceCommandContext
 from cloudshell.api.cloudshell_api import CloudShellAPISession as cs_api
+from api_cache import APISessionCache
+from connection_pool import SSHConnectionPool
+from fleet import HostResult
+from redfish import RedfishClient, RedfishError
+from rollout import RolloutState, TokenBucket, FirmwareRollout
+from racadm_parser import parse_sysinfo, find_job, job_status, job_parser, vdisk_parser, pdisk_parser, parse_vdisks, parse_pdisks, parse_jobs, split_pipelined
+from reactor import Reactor, Return, InThread, read_until, reconnect
+from receive_buffer import ReceiveBuffer
+from inventory import get_inventory, SECTIONS
+from job_watcher import JobWatcher
+from metrics import Metrics
+from log_writer import get_writer
+from output_sink import OutputSink
+from sysinfo_cache import SysInfoCache
+
+LOG_PATH = r'c:\ProgramData\QualiSystems\Dell.log'
+# Progress of rollout_firmware, one file per firmware type and target version so a rerun resumes it
+ROLLOUT_STATE_PATH = r'c:\ProgramData\QualiSystems\DellRollout-{firmware_type}-{version}.json'
+# Latency histograms, rewritten after every command in the Prometheus text format
+METRICS_PATH = r'c:\ProgramData\QualiSystems\Dell.prom'
+# Last sysinfo and disks seen on every resource, with the changes between them
+INVENTORY_PATH = r'c:\ProgramData\QualiSystems\DellInventory.db'
+
+# Shared by every driver instance in this process so commands on the same iDRAC reuse the SSH transport
+ssh_pool = SSHConnectionPool()
+# CloudShell API sessions and decrypted passwords, shared by every command of this driver process
+api_sessions = APISessionCache(cs_api)
+# Parsed getsysinfo per iDRAC address, dropped whenever a command may change what it reports
+sysinfo_cache = SysInfoCache()
+# (share path, bytes per second) -> TokenBucket limiting how fast rollouts start downloads from it
+share_buckets = {}
+# Latency of commands, SSH sessions, racadm replies, job polls and reservation output, per operation and resource
+timings = Metrics()
+
+
+def driver_command(func):
+    """
+    Wraps a public driver command so it is timed and its buffered reservation output is sent when it ends,
+    also on errors
+    """
+    @functools.wraps(func)
+    def wrapper(self, context, *args, **kwargs):
+        trace = timings.start_trace()
+        try:
+            with timings.span(func.__name__, getattr(self, 'name', '')):
+                return func(self, context, *args, **kwargs)
+        finally:
+            try:
+                self._flush_output()
+            finally:
+                if trace is not None:
+                    timings.end_trace()
+                    self._export_metrics(func.__name__, trace)
+    return wrapper
+
+
+def timed(operation):
+    """
+    Time a driver method as operation, labelled with the resource it runs on
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with timings.span(operation, getattr(self, 'name', '')):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
 
 class DellLifecycleDriver (ResourceDriverInterface):
 
-    def _logger(self, message, path=r'c:\ProgramData\QualiSystems\Dell.log', mode='a'):
-        with open(path, mode=mode) as f:
-            f.write(message)
-        f.close()
+    # Overall seconds to wait for the prompt after a command (override with the "Command Timeout" attribute)
+    COMMAND_TIMEOUT = 300
+    # Seconds to wait for the iDRAC to open a shell channel (paramiko waits an hour by default)
+    CHANNEL_OPEN_TIMEOUT = 30
+    # Upper bound of a single select() wait on the channel
+    POLL_INTERVAL = 0.5
+    # Bytes of a reply kept in memory while receiving it, the rest spills to a temporary file
+    RECEIVE_BUFFER_LIMIT = 4 * 1024 * 1024
+    # Longer replies only have their end written to the log
+    LOG_REPLY_LIMIT = 8192
+    # Blocking calls (SSH handshakes, Redfish requests) run at once and per-host seconds for run_on_fleet
+    FLEET_MAX_WORKERS = 16
+    FLEET_HOST_TIMEOUT = 900
+    # run_on_fleet operation -> coroutine run on every host, called with the context and run_on_fleet's argument
+    FLEET_OPERATIONS = {
+        'os': '_fleet_os',
+        'firmware': '_fleet_firmware',
+        'power': '_fleet_power',
+        'disks': '_fleet_disks',
+        'jobs': '_fleet_jobs',
+        'password': '_fleet_password',
+    }
+    # Attempts and seconds between them when reconnecting to an iDRAC that may be resetting
+    RECONNECT_RETRIES = 10
+    RECONNECT_DELAY = 20
+    # Share the iDRACs pull firmware images from
+    FIRMWARE_SHARE = '//192.168.42.207/Dell'
+    FIRMWARE_SHARE_USER = 'User'
+    FIRMWARE_SHARE_PASSWORD = 'Aa123456'
+    # Approximate image sizes, charged against the share's bandwidth when a rollout starts an update
+    FIRMWARE_IMAGE_SIZE = {
+        'bios': 32 * 1024 * 1024,
+        'idrac': 256 * 1024 * 1024,
+        'lifecycle': 256 * 1024 * 1024,
+    }
+    # Rollout defaults: download MB/s per share, share of a wave's hosts allowed to fail before stopping
+    ROLLOUT_SHARE_BANDWIDTH = 50
+    ROLLOUT_MAX_FAILURE_RATIO = 0.2
+    # Per-server seconds of a rollout, which covers the download, the reboot and the verification
+    ROLLOUT_HOST_TIMEOUT = 3600
+
+    def _logger(self, message, path=LOG_PATH, **fields):
+        """
+        Queue a JSON-lines record for the background log writer, extra fields (command, latency...) are added to it
+        """
+        record = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'resource': getattr(self, 'name', None),
+            'reservation': getattr(self, 'reservationid', None),
+            'message': message.strip(),
+        }
+        record.update(fields)
+        get_writer(path).write(record)
+
+    def _secret(self, value):
+        """
+        Mask value in every log record from now on
+        """
+        get_writer(LOG_PATH).add_secret(value)
+        return value
 
     def cleanup(self, chan=None):
         if chan:
@@ -20,19 +146,24 @@ class DellLifecycleDriver (ResourceDriverInterface):
                 chan.close()
             except:
                 pass
-            try:
-                chan.keep_this.close()
-            except:
-                pass
+            client, chan.keep_this = getattr(chan, 'keep_this', None), None
+            if client:
+                ssh_pool.release(client, self.address, self.user, self.port)
 
     def __init__(self):
-        pass
+        # When a list, _WriteMessage collects into it instead of writing to the reservation (see run_on_fleet)
+        self._captured = None
+        # Reservation id -> OutputSink buffering that reservation's output
+        self._sinks = {}
 
     def _cs_session(self, context):
         self.cs_api = cs_api
         self.admin_token = context.connectivity.admin_auth_token
         self.server_address = context.connectivity.server_address
-        self.session = self.cs_api(self.server_address, token_id=self.admin_token, domain='Global')
+        self.session = api_sessions.get(self.server_address, self.admin_token, domain='Global')
+
+    def _decrypt(self, encrypted):
+        return api_sessions.decrypt(self.session, self.server_address, encrypted)
 
     def initialize(self, context):
         """
@@ -42,142 +173,460 @@ class DellLifecycleDriver (ResourceDriverInterface):
         """
         self._cs_session(context=context)
         self.address = context.resource.address
-        self.attrs = context.resource.attributes
-        self.user = context.resource.attributes["User"]
-        self.encrypted = context.resource.attributes["Password"]
-        self.password = self.session.DecryptPassword(self.encrypted).Value
         self.name = context.resource.name
+        self._load_attributes(context.resource.attributes)
+
+    def _load_attributes(self, attrs):
+        """
+        Set the credentials and settings of the resource from its attributes
+        :param dict attrs: attribute name -> value
+        """
+        self.attrs = attrs
+        self.user = attrs["User"]
+        self.encrypted = attrs["Password"]
+        self.password = self._secret(self._decrypt(self.encrypted))
+        self.port = int(attrs.get("SSH Port") or 22)
+        self.command_timeout = float(attrs.get("Command Timeout") or self.COMMAND_TIMEOUT)
+        self.sysinfo_ttl = float(attrs.get("Sysinfo Cache TTL") or sysinfo_cache.ttl)
+        # "redfish" serves what it can over the iDRAC REST API and falls back to SSH for the rest
+        self.backend = (attrs.get("Backend") or 'ssh').lower()
+        self.pipeline = (attrs.get("Pipeline Commands") or 'True').lower() == 'true'
+        # Log a flame graph summary (collapsed stacks) of every command's spans
+        self.flame_summary = (attrs.get("Flame Summary") or 'False').lower() == 'true'
 
+    @timed('session')
     def _session(self):
-        # Init Paramiko
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # allow auto-accepting new hosts
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Connecting SSH with; User: " + self.user + " Password: " + self.password + " Address: " + self.address + '''\r\n''')
-        try:
-            ssh.connect(self.address, 22, username=self.user, password=self.password)
-        except Exception, e:
-            self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Got error while connecting to: " + self.name + " Error: " + str(e) + '\r\n')
-            #self._WriteMessage("Got Error while trying to connect to: " + self.name + " Error: " + str(e))
-            raise Exception("Got Exception: " + str(e))
-        chan = ssh.invoke_shell()
+        self._logger("Connecting SSH with; User: " + self.user + " Address: " + self.address)
+        # A pooled transport may have died since its last health check (e.g. iDRAC reset), so retry once on a fresh one
+        for attempt in xrange(2):
+            try:
+                ssh = ssh_pool.acquire(self.address, self.user, self.password, self.port)
+            except Exception, e:
+                self._logger("Got error while connecting to: " + self.name + " Error: " + str(e))
+                #self._WriteMessage("Got Error while trying to connect to: " + self.name + " Error: " + str(e))
+                raise Exception("Got Exception: " + str(e))
+            try:
+                chan = self._open_shell(ssh)
+                break
+            except Exception, e:
+                ssh_pool.release(ssh, self.address, self.user, self.port, broken=True)
+                ssh_pool.discard(self.address, self.user, self.port)
+                if attempt:
+                    self._logger("Got error while opening shell on: " + self.name + " Error: " + str(e))
+                    raise Exception("Got Exception: " + str(e))
         chan.keep_this = ssh
+        # Swallow the login banner so its prompt can't satisfy the first command's wait
+        try:
+            banner = self._read_until(chan, '>', self.command_timeout)
+        except Exception:
+            self.cleanup(chan=chan)
+            raise
+        self._set_prompt(chan, banner)
+        return chan
+
+    def _open_shell(self, ssh):
+        chan = ssh.get_transport().open_session(timeout=self.CHANNEL_OPEN_TIMEOUT)
+        chan.get_pty()
+        chan.invoke_shell()
         return chan
 
+    def _set_prompt(self, chan, banner):
+        """
+        Remember the exact prompt, which _do_commands counts to know when every pipelined reply is in
+        :param ReceiveBuffer banner: the login banner, closed here
+        """
+        chan.prompt = banner.tail(256).replace('\r', '\n').rsplit('\n', 1)[-1].strip()
+        banner.close()
+
+    @driver_command
     def get_running_os(self, context):
         """
         :param ResourceCommandContext context: the context the command runs on
         """
         self.reservationid = context.reservation.reservation_id
         self._cs_session(context=context)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + "Getting OS Info of: " + self.name + '\r\n')
-        chan = self._session()
+        self._logger("Getting OS Info of: " + self.name)
         self._WriteMessage("Getting OS for: " + self.name)
-        answer = self._GetOS(chan)
+        answer = self._GetOS()
         self._WriteMessage("OS Version: for: " + self.name + " Is: " + answer)
         self._WriteMessage("Done")
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + "OS Info of: " + self.name + " " + answer + '\r\n')
-        self.cleanup(chan=chan)
+        self._logger("OS Info of: " + self.name + " " + answer)
 
+    @driver_command
     def get_firmware(self, context, firmware_type):
         """
         :param ResourceCommandContext context: the context the command runs on
         """
         self.reservationid = context.reservation.reservation_id
         self._cs_session(context=context)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + "Getting Firmware Info of " + firmware_type + " for " + self.name + '\r\n')
-        chan = self._session()
-        if firmware_type.lower() == 'bios':
-            self._WriteMessage("Getting " + firmware_type + " Firmware Version for: " + self.name)
-            version = self._GetBIOS(chan)
-        elif (firmware_type.lower() == 'idrac') or (firmware_type.lower() == 'lifecycle'):
-            self._WriteMessage("Getting " + firmware_type + " Firmware Version for: " + self.name)
-            version = self._GetFW(chan)
-        else:
-            self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + "Bad Input for Getting Firmware: " + firmware_type + '\r\n')
-            self._WriteMessage("Bad Input: " + firmware_type)
-            self.cleanup(chan=chan)
-            raise Exception("Bad Input: " + firmware_type)
+        self._logger("Getting Firmware Info of " + firmware_type + " for " + self.name)
+        field = self._firmware_field(firmware_type)
+        self._WriteMessage("Getting " + firmware_type + " Firmware Version for: " + self.name)
+        version = self._get_sysinfo_field(field)
         self._WriteMessage("Current version is: " + version)
         self._WriteMessage("Done")
-        self.cleanup(chan=chan)
+
+    def _firmware_field(self, firmware_type):
+        """
+        :return: the getsysinfo field holding the version of the firmware type
+        """
+        if firmware_type.lower() == 'bios':
+            return "System BIOS Version"
+        if (firmware_type.lower() == 'idrac') or (firmware_type.lower() == 'lifecycle'):
+            return "Firmware Version"
+        self._logger("Bad Input for Getting Firmware: " + firmware_type)
+        self._WriteMessage("Bad Input: " + firmware_type)
+        raise Exception("Bad Input: " + firmware_type)
 
     def _WriteMessage(self, message):
-        self.session.WriteMessageToReservationOutput(self.reservationid, message)
+        if self._captured is not None:
+            self._captured.append(message)
+            return
+        sink = self._sinks.get(self.reservationid)
+        if sink is None:
+            reservation_id = self.reservationid
+            sink = self._sinks[reservation_id] = OutputSink(lambda message: self._write_output(reservation_id, message))
+        sink.add(message)
+
+    def _write_output(self, reservation_id, message):
+        # Timed here rather than in _WriteMessage, which only buffers
+        with timings.span('write_message', self.name):
+            self.session.WriteMessageToReservationOutput(reservation_id, message)
+
+    def _flush_output(self):
+        """
+        Send the buffered reservation output; a failure is only logged so it doesn't hide the command's own error
+        """
+        for sink in self._sinks.values():
+            try:
+                sink.flush()
+            except Exception, e:
+                self._logger('Failed to write reservation output: ' + str(e))
+
+    def _export_metrics(self, command, trace):
+        # A fleet member's command runs inside the fleet command, which writes the file once when it ends
+        if self._captured is None:
+            try:
+                timings.write(METRICS_PATH)
+            except Exception, e:
+                self._logger('Failed to write metrics: ' + str(e))
+        if getattr(self, 'flame_summary', False):
+            self._logger('Flame summary of ' + command,
+                         command=command, flame=trace.folded())
+
+    def _read_until(self, chan, expect, timeout, on_chunk=None, overlap=256, until=None):
+        """
+        Read from the channel until the prompt regex matches the end of the received text
+        :param on_chunk: called with every chunk as it arrives
+        :param int overlap: how far back from new data a prompt match may start
+        :param until: called after every chunk, when given the reading stops once it returns True instead of on the prompt
+        :return: everything received while waiting, close() it when done
+        :rtype: ReceiveBuffer
+        """
+        prompt = re.compile('(?:' + expect + r')\s*$')
+        deadline = time.time() + timeout
+        buff = ReceiveBuffer(overlap=overlap, max_size=self.RECEIVE_BUFFER_LIMIT)
+        try:
+            while not (until() if until else buff.search(prompt)):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise Exception("Timed out after " + str(timeout) + " seconds waiting for: " + expect)
+                if not chan.recv_ready():
+                    if chan.closed or chan.exit_status_ready():
+                        raise Exception("Channel closed while waiting for: " + expect)
+                    select.select([chan], [], [], min(remaining, self.POLL_INTERVAL))
+                    continue
+                resp = chan.recv(9999)
+                if not resp:
+                    raise Exception("Channel closed while waiting for: " + expect)
+                buff.append(resp)
+                if on_chunk:
+                    on_chunk(resp)
+        except Exception:
+            buff.close()
+            raise
+        return buff
 
-    def _do_command_and_wait(self, chan, command, expect):
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': ssh : ' + command + ' : wait for : ' + expect + '\r\n')
+    def _run_command(self, chan, command, expect, timeout=None, on_chunk=None, overlap=256, until=None):
+        timeout = timeout or self.command_timeout
+        start = time.time()
+        # Drop leftovers of the previous reply so a stale prompt doesn't end this wait early
+        while chan.recv_ready():
+            chan.recv(9999)
         chan.send(command + '\n')
-        buff = ''
-        # while buff.find(expect) < 0:
-        while not re.search(expect, buff, 0):
-            time.sleep(5)
-            resp = chan.recv(9999)
-            buff += resp
-            # print resp
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': replay : ' + buff + ' : wait for : ' + expect + '\r\n')
+        try:
+            with timings.span(self._operation_name(command), self.name):
+                buff = self._read_until(chan, expect, timeout, on_chunk, overlap, until)
+        except Exception, e:
+            self._logger('ssh : ' + command + ' : failed : ' + str(e),
+                         command=command, latency=round(time.time() - start, 3))
+            raise
+        self._log_reply(command, expect, buff, start)
         return buff
 
-    def _GetOS(self, chan):
-        exp = ">"
-        command = "racadm"
-        line = "OS Name                 = "
-        rst = self._do_command_and_wait(chan, command, exp)
-        command = "getsysinfo"
-        rst = self._do_command_and_wait(chan, command, exp)
-        ans = rst.split(line)[1]
-        ans = ans.split('''\r\n''')[0]
-        chan.close()
-        chan.keep_this.close()
-        return ans
-
-    def _GetFW(self, chan):
-        exp = ">"
-        command = "racadm"
-        line = "Firmware Version        = "
-        rst = self._do_command_and_wait(chan, command, exp)
-        command = "getsysinfo"
-        rst = self._do_command_and_wait(chan, command, exp)
-        ans = rst.split(line)[1]
-        ans = ans.split('''\r\n''')[0]
-        chan.close()
-        chan.keep_this.close()
-        return ans
+    def _log_reply(self, command, expect, buff, start):
+        if len(buff) > self.LOG_REPLY_LIMIT:
+            reply = '(' + str(len(buff)) + ' bytes, last ' + str(self.LOG_REPLY_LIMIT) + ') ' + buff.tail(self.LOG_REPLY_LIMIT)
+        else:
+            reply = buff.getvalue()
+        self._logger('replay : ' + reply + ' : wait for : ' + expect,
+                     command=command, latency=round(time.time() - start, 3), size=len(buff))
+
+    def _operation_name(self, command):
+        """
+        Metrics label of a command: its first two words (never its arguments, which may hold passwords)
+        """
+        name = ' '.join(command.split()[:2])
+        return name + ' (pipelined)' if '\n' in command else name
+
+    def _do_command_and_wait(self, chan, command, expect, timeout=None):
+        buff = self._run_command(chan, command, expect, timeout)
+        try:
+            return buff.getvalue()
+        finally:
+            buff.close()
+
+    def _do_commands(self, chan, commands, expect, timeout=None):
+        """
+        Run several commands in one round trip: they are queued on the channel together, each followed by a
+        unique marker line the shell rejects, so every reply is followed by a prompt, the marker's error and
+        another prompt
+        Falls back to one command at a time when the "Pipeline Commands" attribute is False or the prompt is unknown
+        Only for queries that are safe to run again: if the iDRAC drops typed-ahead lines the wait times out, and
+        whatever was accepted can't be told apart from what was lost
+        :return: list of replies, one per command, like _do_command_and_wait would return them
+        """
+        prompt = getattr(chan, 'prompt', '')
+        if not self.pipeline or len(commands) < 2 or not prompt:
+            return [self._do_command_and_wait(chan, command, expect, timeout) for command in commands]
+        text, markers, count, done = self._pipeline(commands, prompt)
+        buff = self._run_command(chan, text, expect, timeout, on_chunk=count, until=done)
+        try:
+            out = buff.getvalue()
+        finally:
+            buff.close()
+        return self._split_replies(out, prompt, commands, markers)
+
+    def _pipeline(self, commands, prompt):
+        """
+        :return: (the lines to send, their markers, on_chunk callable counting the prompts,
+                  until callable true once every reply is in)
+        """
+        token = uuid.uuid4().hex[:12]
+        markers = ['__mark_' + token + '_' + str(x) + '__' for x in xrange(len(commands))]
+        lines = []
+        for command, marker in zip(commands, markers):
+            lines += [command, marker]
+        # Count the prompts as they arrive (a prompt may be split across chunks); the reply of the last marker
+        # ends with prompt number 2 * len(commands)
+        seen = [0, '']
+
+        def count(chunk):
+            text = seen[1] + chunk
+            seen[0] += text.count(prompt)
+            seen[1] = text[max(len(text) - len(prompt) + 1, 0):]
+
+        return '\n'.join(lines), markers, count, lambda: seen[0] >= 2 * len(commands)
+
+    def _split_replies(self, out, prompt, commands, markers):
+        replies = split_pipelined(out, prompt, commands, markers)
+        if replies is None:
+            # Only the operation names, the commands may hold passwords
+            operations = ', '.join(self._operation_name(command) for command in commands)
+            self._logger('Lost track of pipelined replies of: ' + operations)
+            raise Exception("Couldn't find the replies of: " + operations)
+        return replies
+
+    def _do_command_and_parse(self, chan, command, expect, parser, timeout=None):
+        """
+        Run a command and parse its reply while it streams in, without keeping it as one string
+        :param parser: racadm_parser.RecordParser
+        :return: list of the parsed records
+        """
+        records = []
+        buff = self._run_command(chan, command, expect, timeout, lambda chunk: records.extend(parser.feed(chunk)))
+        buff.close()
+        return records + parser.close()
+
+    def _async_session(self):
+        """
+        Coroutine version of _session for a reactor.Reactor: the handshake and the channel open run in helper
+        threads, the login banner is read on the loop
+        """
+        self._logger("Connecting SSH with; User: " + self.user + " Address: " + self.address)
+        start = time.time()
+        for attempt in xrange(2):
+            try:
+                ssh = yield InThread(ssh_pool.acquire, self.address, self.user, self.password, self.port)
+            except Exception, e:
+                self._logger("Got error while connecting to: " + self.name + " Error: " + str(e))
+                timings.observe('session', self.name, time.time() - start, False)
+                raise Exception("Got Exception: " + str(e))
+            try:
+                chan = yield InThread(self._open_shell, ssh)
+                break
+            except Exception, e:
+                ssh_pool.release(ssh, self.address, self.user, self.port, broken=True)
+                ssh_pool.discard(self.address, self.user, self.port)
+                if attempt:
+                    self._logger("Got error while opening shell on: " + self.name + " Error: " + str(e))
+                    timings.observe('session', self.name, time.time() - start, False)
+                    raise Exception("Got Exception: " + str(e))
+        chan.keep_this = ssh
+        try:
+            banner = yield read_until(chan, '>', self.command_timeout, max_size=self.RECEIVE_BUFFER_LIMIT)
+        except Exception:
+            self.cleanup(chan=chan)
+            timings.observe('session', self.name, time.time() - start, False)
+            raise
+        self._set_prompt(chan, banner)
+        timings.observe('session', self.name, time.time() - start)
+        raise Return(chan)
+
+    def _async_command_and_wait(self, chan, command, expect, timeout=None, on_chunk=None, until=None):
+        """
+        Coroutine version of _do_command_and_wait
+        """
+        timeout = timeout or self.command_timeout
+        operation = self._operation_name(command)
+        start = time.time()
+        while chan.recv_ready():
+            chan.recv(9999)
+        chan.send(command + '\n')
+        try:
+            buff = yield read_until(chan, expect, timeout, on_chunk, until=until, max_size=self.RECEIVE_BUFFER_LIMIT)
+        except Exception, e:
+            timings.observe(operation, self.name, time.time() - start, False)
+            self._logger('ssh : ' + command + ' : failed : ' + str(e),
+                         command=command, latency=round(time.time() - start, 3))
+            raise
+        timings.observe(operation, self.name, time.time() - start)
+        try:
+            self._log_reply(command, expect, buff, start)
+            out = buff.getvalue()
+        finally:
+            buff.close()
+        raise Return(out)
+
+    def _async_commands(self, chan, commands, expect, timeout=None):
+        """
+        Coroutine version of _do_commands
+        """
+        prompt = getattr(chan, 'prompt', '')
+        if not self.pipeline or len(commands) < 2 or not prompt:
+            replies = []
+            for command in commands:
+                replies.append((yield self._async_command_and_wait(chan, command, expect, timeout)))
+            raise Return(replies)
+        text, markers, count, done = self._pipeline(commands, prompt)
+        out = yield self._async_command_and_wait(chan, text, expect, timeout, on_chunk=count, until=done)
+        raise Return(self._split_replies(out, prompt, commands, markers))
+
+    def _redfish_call(self, method, *args):
+        """
+        Call a RedfishClient method when the Redfish backend is selected
+        :return: its result, or None when the backend is SSH or the call failed, so the caller falls back to SSH
+        """
+        if self.backend != 'redfish':
+            return None
+        client = RedfishClient(self.address, self.user, self.password, url=self.attrs.get("Redfish URL") or None)
+        try:
+            with timings.span('redfish ' + method, self.name):
+                return getattr(client, method)(*args)
+        except RedfishError, e:
+            self._logger('Redfish ' + method + ' failed for: ' + self.name + ', falling back to SSH: ' + str(e))
+            return None
+
+    def _get_sysinfo(self, chan=None):
+        """
+        Get the parsed getsysinfo of the iDRAC, from the cache when it is fresh
+        :param chan: channel to query on, it is closed afterwards; a new session is opened when needed if not given
+        :rtype: dict
+        """
+        info = sysinfo_cache.get(self.address, self.sysinfo_ttl)
+        if info is None:
+            info = self._redfish_call('get_sysinfo') or self._ssh_sysinfo(chan)
+            sysinfo_cache.put(self.address, info)
+            self._record_inventory('sysinfo', info)
+        self.cleanup(chan=chan)
+        return info
+
+    def _ssh_sysinfo(self, chan=None):
+        if not chan:
+            chan = self._session()
+        try:
+            exp = ">"
+            self._do_command_and_wait(chan, "racadm", exp)
+            return parse_sysinfo(self._do_command_and_wait(chan, "getsysinfo", exp))
+        finally:
+            self.cleanup(chan=chan)
+
+    def _get_sysinfo_field(self, field, chan=None):
+        info = self._get_sysinfo(chan)
+        if field not in info and self.backend == 'redfish':
+            # Redfish doesn't report every getsysinfo field (e.g. the OS name), complete the snapshot over SSH
+            info = dict(info)
+            info.update(self._ssh_sysinfo())
+            sysinfo_cache.put(self.address, info)
+        if field not in info:
+            sysinfo_cache.invalidate(self.address)
+            raise Exception("Couldn't find \"" + field + "\" in getsysinfo of: " + self.name)
+        return info[field]
+
+    def _record_inventory(self, section, *data):
+        """
+        Store a freshly fetched section in the inventory; a failure there never fails the command
+        """
+        try:
+            inventory = get_inventory(INVENTORY_PATH)
+            if section == 'sysinfo':
+                inventory.update_sysinfo(self.name, *data)
+            else:
+                inventory.update_disks(self.name, *data)
+        except Exception, e:
+            self._logger('Failed to store ' + section + ' of: ' + self.name + ' in the inventory: ' + str(e))
+
+    def _GetOS(self, chan=None):
+        return self._get_sysinfo_field("OS Name", chan)
+
+    def _GetFW(self, chan=None):
+        return self._get_sysinfo_field("Firmware Version", chan)
 
+    @timed('job_status')
     def _CheckJobStatus(self, chan, job_id):
-        command = 'racadm jobqueue view'
+        command = 'racadm jobqueue view -i ' + job_id
         exp = '>'
-        out = self._do_command_and_wait(chan, command, exp)
-        rst1 = out.split('Job ID')
-        message = rst1
-        status = 'Error'
-        for job in rst1:
-            if job_id in job:
-                message = (job.split('Message=')[1]).split('\n')[0]
-                status = (job.split('Status=')[1]).split('\n')[0]
-                break
-        return message, status
+        status = self._redfish_call('job_status', job_id)
+        if status:
+            return status
+        return job_status(self._do_command_and_parse(chan, command, exp, job_parser()), job_id)
 
-    def _GetBIOS(self, chan):
-        exp = ">"
-        command = "racadm"
-        line = "System BIOS Version     = "
-        self._do_command_and_wait(chan, command, exp)
-        command = "getsysinfo"
-        rst = self._do_command_and_wait(chan, command, exp)
-        ans = rst.split(line)[1]
-        ans = ans.split('''\r\n''')[0]
-        chan.close()
-        chan.keep_this.close()
-        return ans
+    def _GetBIOS(self, chan=None):
+        return self._get_sysinfo_field("System BIOS Version", chan)
 
+    @driver_command
     def power_control(self, context, operation):
         """
         :param ResourceCommandContext context: the context the command runs on
         """
         self.reservationid = context.reservation.reservation_id
         self._cs_session(context=context)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Doing Power Operation for: ' + self.name + " Command: " + operation + '''\r\n''')
+        self._logger('Doing Power Operation for: ' + self.name + " Command: " + operation)
         exp = '>'
+        command = self._power_command(operation)
+        ans = self._redfish_call('power', operation)
+        if ans is None:
+            chan = self._session()
+            try:
+                ans = self._do_command_and_wait(chan, command, exp)
+            finally:
+                self.cleanup(chan=chan)
+        self._power_answer(ans)
+
+    def _power_command(self, operation):
+        """
+        :return: the racadm command of the power operation
+        """
         command = 'racadm serveraction '
         if operation.lower() == 'start':
             command += 'powerup'
@@ -191,163 +640,159 @@ class DellLifecycleDriver (ResourceDriverInterface):
             command += 'powerstatus'
         else:
             self._WriteMessage("Bad Input: " + operation)
-            self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Bad Input for Power Operation: ' + operation + '''\r\n''')
+            self._logger('Bad Input for Power Operation: ' + operation)
             raise Exception("Bad Input: " + operation)
-        chan = self._session()
-        ans = self._do_command_and_wait(chan, command, exp)
+        if operation != 'status':
+            sysinfo_cache.invalidate(self.address)
+        return command
+
+    def _power_answer(self, ans):
         out = ''
         for line in ans.splitlines():
             if "Server " in line:
                 out = line
         self._WriteMessage(out if out else ans)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Answer for Power Operation for: ' + self.name + " Replay: " + ans + '''\r\n''')
-        self.cleanup(chan=chan)
+        self._logger('Answer for Power Operation for: ' + self.name + " Replay: " + ans)
 
+    @driver_command
     def update_firmware(self, context, firmware_type):
         """
         :param ResourceCommandContext context: the context the command runs on
         """
         self.reservationid = context.reservation.reservation_id
         self._cs_session(context=context)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Updating Firmware For: ' + self.name + " Firmware Type: " + firmware_type + '''\r\n''')
-        chan = self._session()
+        self._logger('Updating Firmware For: ' + self.name + " Firmware Type: " + firmware_type)
         if firmware_type.lower() == 'bios':
             self._WriteMessage("Going to update BIOS version.")
-            version = self._GetBIOS(chan)
+            version = self._GetBIOS()
             file_name = 'bios.EXE'
         elif (firmware_type.lower() == 'idrac') or (firmware_type.lower() == 'lifecycle'):
             self._WriteMessage("Going to update iDRAC & LifeCycle Controller version.")
-            version = self._GetFW(chan)
+            version = self._GetFW()
             file_name = 'idrac.EXE'
         else:
-            self.cleanup(chan=chan)
             self._WriteMessage("Bad Input: " + str(firmware_type))
-            self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Bad Input for updating Firmware For: ' + self.name + " Firmware Type: " + firmware_type + '''\r\n''')
+            self._logger('Bad Input for updating Firmware For: ' + self.name + " Firmware Type: " + firmware_type)
             raise Exception("Bad Input: " + firmware_type)
 
         self._WriteMessage("Current FW Version is: " + version)
-        command = 'racadm set lifecyclecontroller.lcattributes.lifecyclecontrollerstate 1'
         exp = '>'
+        ftp_user = self.FIRMWARE_SHARE_USER
+        ftp_password = self._secret(self.FIRMWARE_SHARE_PASSWORD)
+        combine_path = self.FIRMWARE_SHARE
+        commands = [
+            'racadm set lifecyclecontroller.lcattributes.lifecyclecontrollerstate 1',
+            'racadm update -f {filename} -u {username} -p {password} -l {path}'.format(filename=file_name, username=ftp_user, password=ftp_password, path=combine_path),
+            'racadm jobqueue view',
+        ]
+        sysinfo_cache.invalidate(self.address)
         chan = self._session()
-        self._do_command_and_wait(chan, command, exp)
-        remote_server = '192.168.42.207'
-        remote_folder = 'Dell'
-        ftp_user = 'User'
-        ftp_password = 'Aa123456'
-        combine_path = '//' + remote_server + '/' + remote_folder
-        command = 'racadm update -f {filename} -u {username} -p {password} -l {path}'.format(filename=file_name, username=ftp_user, password=ftp_password, path=combine_path)
-        self._do_command_and_wait(chan, command, exp)
-        command = 'racadm jobqueue view'
-        out = self._do_command_and_wait(chan, command, exp)
+        try:
+            # One at a time: racadm update isn't idempotent, so it must never be left to typed-ahead input that
+            # the iDRAC may drop, and the job queue is only read once the update was accepted
+            for command in commands:
+                out = self._do_command_and_wait(chan, command, exp)
+        except Exception:
+            self.cleanup(chan=chan)
+            raise
         # if ('ERROR: RAC991' in out) or ('ERROR: RAC1135' in out):
         #     return out, 'Error'
-        rst1 = out.split('Job ID')
-        job_id = ''
-        message = ''
-        for job in rst1:
-            if 'Downloading' in job and 'Firmware Update' in job:
-                job_id = (job.split('JID')[1]).split('\n')[0]
-                message = (job.split('Message=')[1]).split('\n')[0]
+        job_id, message = find_job(out, 'Downloading', 'Firmware Update')
 
         if not job_id:
-            self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + "Couldn't get Job ID: " + out + '''\r\n''')
+            self._logger("Couldn't get Job ID: " + out)
             self._WriteMessage("Couldn't get Job ID: " + message)
             raise Exception("Couldn't get Job ID: " + message)
-        done = True
+        watcher = JobWatcher(lambda jid: self._CheckJobStatus(chan, jid), self._job_transition)
         try:
-            while done:
-                msg, stat = self._CheckJobStatus(chan, job_id)
-                if 'Failed' in stat:
-                    self._WriteMessage("Failed to Update Firmware: " + msg)
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Failed to Updating the Firmware: " + msg + '''\r\n''')
-                    raise Exception("Failed to Update Firmware: " + msg)
+            msg, stat = watcher.wait(job_id, until=lambda msg, stat: 'scheduled' in msg.lower())
+            if 'Failed' in stat:
+                self._WriteMessage("Failed to Update Firmware: " + msg)
+                self._logger("Failed to Updating the Firmware: " + msg)
+                raise Exception("Failed to Update Firmware: " + msg)
 
-                elif 'Error' in stat:
-                    self._WriteMessage("Got Error running Update Firmware: " + msg)
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Got Error Updating the Firmware: " + msg + '''\r\n''')
-                    raise Exception("Got Error running Update Firmware: " + msg)
+            elif 'Error' in stat:
+                self._WriteMessage("Got Error running Update Firmware: " + msg)
+                self._logger("Got Error Updating the Firmware: " + msg)
+                raise Exception("Got Error running Update Firmware: " + msg)
 
-                elif 'scheduled' in msg.lower():
-                    self._WriteMessage(msg)
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Updating the Firmware is Scheduled, Rebooting: " + msg + '''\r\n''')
-                    self._WriteMessage("Rebooting Server...")
-                    self.cleanup(chan=chan)
-                    self.power_control(context, 'reboot')
-                    time.sleep(30)
-                    done = False
-                elif 'Completed' in stat:
-                    self._WriteMessage(msg)
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Updating the Firmware is Completed: " + msg + '''\r\n''')
-                    done = False
-                else:
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Updating Firmware Status: " + msg + '''\r\n''')
-                    self._WriteMessage(msg)
-                time.sleep(5)
+            elif 'scheduled' in msg.lower():
+                self._logger("Updating the Firmware is Scheduled, Rebooting: " + msg)
+                self._WriteMessage("Rebooting Server...")
+                self.cleanup(chan=chan)
+                self.power_control(context, 'reboot')
+                time.sleep(30)
+            else:
+                self._logger("Updating the Firmware is Completed: " + msg)
             self.cleanup(chan=chan)
             self._VerifyFirmware(version, firmware_type, job_id)
 
         except Exception, e:
-            self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + "Got Exception Running command: (Could be false-positive due to iDRAC resetting it self)" + str(e) + '''\r\n''')
+            self._logger("Got Exception Running command: (Could be false-positive due to iDRAC resetting it self): " + str(e))
             self.cleanup(chan=chan)
             time.sleep(30)
             self._VerifyFirmware(version, firmware_type, job_id)
         finally:
             self.cleanup(chan=chan)
 
+    def _job_transition(self, job_id, message, status):
+        self._logger("Job " + job_id + " Status: " + status.strip() + " Message: " + message)
+        self._WriteMessage(message)
+
     def _VerifyFirmware(self, ver, fw_type, jid):
-        retires = 10
-        delay = 20
+        retires = self.RECONNECT_RETRIES
+        delay = self.RECONNECT_DELAY
         chan = ''
+        sysinfo_cache.invalidate(self.address)
+        # The iDRAC may have reset during the update, so don't hand out connections opened before it
+        ssh_pool.discard(self.address, self.user, self.port)
         self._WriteMessage("Trying to reconnect to the iDRAC (Might take up-to 3 minutes)")
         for x in xrange(retires):
             try:
-                self._logger("Trying to re-connect to \"" + self.name + '\"... Retry number: ' + str(x) + '\r\n')
+                self._logger("Trying to re-connect to \"" + self.name + '\"... Retry number: ' + str(x))
                 chan = self._session()
                 break
             except Exception, e:
-                self._logger("Got Error: " + str(e) + '''\r\n''')
-                self._logger("Failed to connect to \"" + self.name + '\"... Retrying in: ' + str(delay) + " Seconds..." + '\r\n')
+                self._logger("Got Error: " + str(e))
+                self._logger("Failed to connect to \"" + self.name + '\"... Retrying in: ' + str(delay) + " Seconds...")
                 time.sleep(delay)
 
         if not chan:
             self._WriteMessage("Failed to connect to \"" + self.name + '\" after ' + str(retires) + ' times')
-            self._logger("Failed to connect to \"" + self.name + '\" after ' + str(retires) + ' times' + '\r\n')
+            self._logger("Failed to connect to \"" + self.name + '\" after ' + str(retires) + ' times')
             raise Exception("Failed to connect to \"" + self.name + '\" after ' + str(retires) + ' times')
         new_ver = ''
         status_retries = 100
         status_delay = 5
-        if fw_type.lower() == 'bios':
-            for x in xrange(status_retries):
-                msg, stat = self._CheckJobStatus(chan, jid)
+        try:
+            if fw_type.lower() == 'bios':
+                watcher = JobWatcher(lambda job_id: self._CheckJobStatus(chan, job_id), self._job_transition)
+                msg, stat = watcher.wait(jid, timeout=status_retries * status_delay)
                 if 'Failed' in stat:
                     self._WriteMessage("Failed to Update Firmware: " + msg)
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Failed to Update the Firmware: " + msg + '''\r\n''')
+                    self._logger("Failed to Update the Firmware: " + msg)
                     raise Exception("Failed to Update Firmware: " + msg)
 
                 elif 'Error' in stat:
                     self._WriteMessage("Got Error running Update Firmware: " + msg)
-                    self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Got Error Updating the Firmware: " + msg + '''\r\n''')
+                    self._logger("Got Error Updating the Firmware: " + msg)
                     raise Exception("Got Error running Update Firmware: " + msg)
 
                 elif 'Completed' in stat:
-                    self._WriteMessage(msg)
                     self._logger("Job Completed: " + msg)
-                    break
-                else:
-                    self._WriteMessage(msg)
-                    self._logger("Job Status: " + msg)
-                    time.sleep(status_delay)
-            try:
-                new_ver = self._GetBIOS(chan)
-            except Exception, e:
-                self._logger("Got Error while trying to query for FW Version: " + str(e) + ' retrying..' + '\r\n', )
-                new_ver = self._GetBIOS(chan)
-        elif (fw_type.lower() == 'idrac') or (fw_type.lower() == 'lifecycle'):
-            try:
-                new_ver = self._GetFW(chan)
-            except Exception, e:
-                self._logger("Got Error while trying to query for FW Version: " + str(e) + ' retrying..' + '\r\n', )
-                new_ver = self._GetFW(chan)
+                try:
+                    new_ver = self._GetBIOS(chan)
+                except Exception, e:
+                    self._logger("Got Error while trying to query for FW Version: " + str(e) + ' retrying..')
+                    new_ver = self._GetBIOS()
+            elif (fw_type.lower() == 'idrac') or (fw_type.lower() == 'lifecycle'):
+                try:
+                    new_ver = self._GetFW(chan)
+                except Exception, e:
+                    self._logger("Got Error while trying to query for FW Version: " + str(e) + ' retrying..')
+                    new_ver = self._GetFW()
+        finally:
+            self.cleanup(chan=chan)
         if LooseVersion(new_ver) > LooseVersion(ver):
             out = "Successfully updated the " + fw_type + ' Firmware to version: ' + new_ver
         elif LooseVersion(new_ver) == LooseVersion(ver):
@@ -355,54 +800,63 @@ class DellLifecycleDriver (ResourceDriverInterface):
         else:
             out = "New Version is: " + new_ver
 
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + " Updating Firmware completed: " + out + '''\r\n''')
+        self._logger("Updating Firmware completed: " + out)
         self._WriteMessage(out)
         self._WriteMessage("Done Updating Firmware")
 
     def _get_v_disks(self, chan):
         command = 'racadm raid get vdisks -o'
         exp = ">"
-        out = self._do_command_and_wait(chan, command, exp)
-        rst = out.split('Disk.Virtual.')
-        disk_names = []
-        disk_sizes = []
-        disk_raids = []
-        for disk in rst:
-            if (disk != '\n') and ('racadm' not in disk):
-                disk_name = disk.split('Name                             = ')[1].split('\r\n')[0]
-                disk_size = disk.split('Size                             = ')[1].split('\r\n')[0]
-                disk_raid = disk.split('Layout                           = ')[1].split('\r\n')[0]
-                disk_names.append(disk_name)
-                disk_sizes.append(disk_size)
-                disk_raids.append(disk_raid)
-        return disk_names, disk_sizes, disk_raids
+        disks = self._do_command_and_parse(chan, command, exp, vdisk_parser())
+        return [disk.name for disk in disks], [disk.size for disk in disks], [disk.layout for disk in disks]
 
     def _get_p_disks(self, chan):
         command = 'racadm raid get pdisks -o'
         exp = ">"
-        out = self._do_command_and_wait(chan, command, exp)
-        rst = out.split('Disk.Bay.')
-        disk_names = []
-        disk_sizes = []
-        for disk in rst:
-            if (disk != '\n') and ('racadm' not in disk):
-                disk_name = disk.split('Name                             = ')[1].split('\r\n')[0]
-                disk_size = disk.split('Size                             = ')[1].split('\r\n')[0]
-                disk_names.append(disk_name)
-                disk_sizes.append(disk_size)
-        return disk_names, disk_sizes
+        disks = self._do_command_and_parse(chan, command, exp, pdisk_parser())
+        return [disk.name for disk in disks], [disk.size for disk in disks]
 
+    def _get_disks(self, chan):
+        """
+        :return: ((vdisk names, sizes, layouts), (pdisk names, sizes)), both queried in one round trip
+        """
+        if not self.pipeline:
+            return self._get_v_disks(chan), self._get_p_disks(chan)
+        v_out, p_out = self._do_commands(chan, ['racadm raid get vdisks -o', 'racadm raid get pdisks -o'], '>')
+        return self._disk_lists(v_out, p_out)
+
+    def _disk_lists(self, v_out, p_out):
+        v_disks, p_disks = parse_vdisks(v_out), parse_pdisks(p_out)
+        return ([disk.name for disk in v_disks], [disk.size for disk in v_disks], [disk.layout for disk in v_disks]), \
+               ([disk.name for disk in p_disks], [disk.size for disk in p_disks])
+
+    def _fetch_disks(self):
+        """
+        Query the disks, over Redfish when selected, and store them in the inventory
+        :return: ((vdisk names, sizes, layouts), (pdisk names, sizes))
+        """
+        disks = self._redfish_call('get_disks')
+        if not disks:
+            chan = self._session()
+            try:
+                disks = self._get_disks(chan)
+            finally:
+                self.cleanup(chan=chan)
+        self._record_inventory('disks', *disks)
+        return disks
+
+    @driver_command
     def get_disks(self, context):
         """
         :param ResourceCommandContext context: the context the command runs on
         """
         self.reservationid = context.reservation.reservation_id
         self._cs_session(context=context)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Getting Virtual & Physical disks For: ' + self.name + '''\r\n''')
-        chan = self._session()
-        v_ds_name, v_ds_size, v_ds_raid = self._get_v_disks(chan)
-        p_ds_name, p_ds_size = self._get_p_disks(chan)
-        self.cleanup(chan=chan)
+        self._logger('Getting Virtual & Physical disks For: ' + self.name)
+        self._disks_report(self._fetch_disks())
+
+    def _disks_report(self, disks):
+        (v_ds_name, v_ds_size, v_ds_raid), (p_ds_name, p_ds_size) = disks
         out = ''
         if len(v_ds_name) > 0:
             out += "Found " + str(len(v_ds_name)) + " Virtual Disks" + '\n'
@@ -419,32 +873,360 @@ class DellLifecycleDriver (ResourceDriverInterface):
             out += "Couldn't find any Physical Disks" + '\n'
         if out != '':
             self._WriteMessage(out)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Getting Virtual & Physical disks For: ' + self.name + " Output: " + out + '''\r\n''')
+        self._logger('Getting Virtual & Physical disks For: ' + self.name + " Output: " + out)
 
+    @driver_command
     def change_root_password(self, context, password):
         """
         :param ResourceCommandContext context: the context the command runs on
         """
         self.reservationid = context.reservation.reservation_id
         self._cs_session(context=context)
-        self._logger(time.strftime('%Y-%m-%d %H:%M:%S') + ': Changing root password for: ' + self.name + '''\r\n''')
+        self._secret(password)
+        self._logger('Changing root password for: ' + self.name)
         self._WriteMessage("Going to change root password")
-        chan = self._session()
-        command = 'racadm set iDRAC.Users.2.Password ' + password
-        exp = '>'
-        out = self._do_command_and_wait(chan, command, exp)
+        chan = None
+        if self._redfish_call('set_password', password):
+            out = 'Password changed successfully'
+        else:
+            chan = self._session()
+            command = 'racadm set iDRAC.Users.2.Password ' + password
+            exp = '>'
+            try:
+                out = self._do_command_and_wait(chan, command, exp)
+            except Exception:
+                self.cleanup(chan=chan)
+                raise
         try:
             if 'successfully' in out:
                 self._WriteMessage("Successfully change password to: " + password)
-                self._logger("Successfully change password to: " + password + '\r\n')
+                self._logger("Successfully change password to: " + password)
                 self.session.SetAttributeValue(self.name, 'Password', password)
                 self.password = password
             else:
-                self._logger("Failed to change password for " + self.name + ", Error: " + out + '\r\n')
+                self._logger("Failed to change password for " + self.name + ", Error: " + out)
                 self._WriteMessage("Failed to change password for " + self.name + ', Error: ' + out)
         except Exception, e:
-            self._logger("Failed to change password for " + self.name + ", Error: " + str(e) + '\r\n')
+            self._logger("Failed to change password for " + self.name + ", Error: " + str(e))
             self._WriteMessage("Failed to change password for " + self.name + ', Error: ' + str(e))
 
         finally:
-            self.cleanup(chan=chan)
\ No newline at end of file
+            self.cleanup(chan=chan)
+
+    @driver_command
+    def run_on_fleet(self, context, resources, operation, argument=''):
+        """
+        Run one of the driver commands against many iDRACs at once and write a single report
+        :param ResourceCommandContext context: the context the command runs on
+        :param str resources: comma separated resource names, empty for every resource of this model in the reservation
+        :param str operation: os, firmware, power, disks, jobs or password
+        :param str argument: the command's argument (firmware type, power operation, job ids or new password)
+        """
+        self.reservationid = context.reservation.reservation_id
+        self._cs_session(context=context)
+        if operation.lower() not in self.FLEET_OPERATIONS:
+            self._WriteMessage("Bad Input: " + operation)
+            raise Exception("Bad Input: " + operation)
+        command = self.FLEET_OPERATIONS[operation.lower()]
+        names = self._resource_names(context, resources)
+        self._logger('Running ' + command + ' on fleet: ' + ', '.join(names))
+        self._WriteMessage("Running " + operation + " on " + str(len(names)) + " servers")
+
+        def run(name):
+            member = yield InThread(self._fleet_member, name)
+            try:
+                yield getattr(member, command)(context, argument)
+            except Exception, e:
+                raise Exception('\n'.join(member._captured + [str(e)]))
+            raise Return('\n'.join(member._captured))
+
+        # Every server's channels are read on this one loop, only blocking calls take a helper thread
+        reactor = Reactor(int(self.attrs.get("Fleet Max Workers") or self.FLEET_MAX_WORKERS))
+        host_timeout = float(self.attrs.get("Fleet Host Timeout") or self.FLEET_HOST_TIMEOUT)
+        start = time.time()
+        tasks = [reactor.spawn(run(name), host_timeout) for name in names]
+        try:
+            reactor.run()
+        finally:
+            reactor.close()
+        results = [HostResult(name, task.error is None, task.result if task.error is None else str(task.error[1]),
+                              task.elapsed) for name, task in zip(names, tasks)]
+        failed = [result for result in results if not result.ok]
+        out = ''
+        for result in results:
+            out += "--- " + result.host + (" OK" if result.ok else " FAILED") + " ({0:.1f}s)".format(result.elapsed) + '\n'
+            out += result.output + '\n'
+        out += "Done: " + str(len(results) - len(failed)) + " succeeded, " + str(len(failed)) + " failed in {0:.1f}s".format(time.time() - start)
+        self._WriteMessage(out)
+        self._logger('Fleet ' + command + ' Output: ' + out)
+
+    def _fleet_member(self, name):
+        """
+        Copy of this driver bound to another resource, with its output captured instead of written
+        """
+        details = self.session.GetResourceDetails(name)
+        attrs = dict((attr.Name.split('.')[-1], attr.Value) for attr in details.ResourceAttributes)
+        member = copy.copy(self)
+        member.name = name
+        member.address = details.Address
+        member._load_attributes(attrs)
+        member._captured = []
+        member._sinks = {}
+        return member
+
+    def _fleet_os(self, context, argument):
+        self._WriteMessage("Getting OS for: " + self.name)
+        answer = yield self._async_sysinfo_field("OS Name")
+        self._WriteMessage("OS Version: for: " + self.name + " Is: " + answer)
+        self._WriteMessage("Done")
+
+    def _fleet_firmware(self, context, argument):
+        field = self._firmware_field(argument)
+        self._WriteMessage("Getting " + argument + " Firmware Version for: " + self.name)
+        version = yield self._async_sysinfo_field(field)
+        self._WriteMessage("Current version is: " + version)
+        self._WriteMessage("Done")
+
+    def _fleet_power(self, context, argument):
+        command = self._power_command(argument)
+        ans = None
+        if self.backend == 'redfish':
+            ans = yield InThread(self._redfish_call, 'power', argument)
+        if ans is None:
+            chan = yield self._async_session()
+            try:
+                ans = yield self._async_command_and_wait(chan, command, '>')
+            finally:
+                self.cleanup(chan=chan)
+        self._power_answer(ans)
+
+    def _fleet_disks(self, context, argument):
+        disks = None
+        if self.backend == 'redfish':
+            disks = yield InThread(self._redfish_call, 'get_disks')
+        if not disks:
+            chan = yield self._async_session()
+            try:
+                commands = ['racadm raid get vdisks -o', 'racadm raid get pdisks -o']
+                v_out, p_out = yield self._async_commands(chan, commands, '>')
+            finally:
+                self.cleanup(chan=chan)
+            disks = self._disk_lists(v_out, p_out)
+        yield InThread(self._record_inventory, 'disks', *disks)
+        self._disks_report(disks)
+
+    def _fleet_jobs(self, context, argument):
+        """
+        Wait until the given comma separated jobs, or every job of the iDRAC not finished yet, are finished or
+        scheduled for the next reboot; the iDRAC may still be resetting from an update, so connecting is retried
+        """
+        def on_error(attempt, e):
+            self._logger("Failed to connect to \"" + self.name + '\"... Retry number: ' + str(attempt) + ' ' + str(e))
+
+        chan = yield reconnect(self._async_session, self.RECONNECT_RETRIES, self.RECONNECT_DELAY, on_error)
+        try:
+            job_ids = [job_id.strip() for job_id in argument.split(',') if job_id.strip()]
+            if not job_ids:
+                out = yield self._async_command_and_wait(chan, 'racadm jobqueue view', '>')
+                job_ids = [job.job_id for job in parse_jobs(out) if not JobWatcher.finished(job.status)]
+            watcher = JobWatcher(lambda job_id: self._async_job_status(chan, job_id), self._job_transition)
+            states = yield watcher.watch(job_ids, until=lambda msg, stat: 'Scheduled' in stat)
+        finally:
+            self.cleanup(chan=chan)
+        if not job_ids:
+            self._WriteMessage("No pending jobs")
+        failed = [job_id for job_id in job_ids if 'Failed' in states[job_id][1] or 'Error' in states[job_id][1]]
+        for job_id in job_ids:
+            self._WriteMessage(job_id + ": " + states[job_id][1] + " " + states[job_id][0])
+        if failed:
+            raise Exception("Jobs failed: " + ', '.join(failed))
+
+    def _fleet_password(self, context, argument):
+        # Changes a CloudShell attribute too, so it runs as the blocking command in a helper thread
+        yield InThread(self.change_root_password, context, argument)
+
+    def _async_sysinfo_field(self, field):
+        """
+        Coroutine version of _get_sysinfo_field
+        """
+        info = sysinfo_cache.get(self.address, self.sysinfo_ttl)
+        if info is None:
+            if self.backend == 'redfish':
+                info = yield InThread(self._redfish_call, 'get_sysinfo')
+            if not info:
+                info = yield self._async_ssh_sysinfo()
+            sysinfo_cache.put(self.address, info)
+            yield InThread(self._record_inventory, 'sysinfo', info)
+        if field not in info and self.backend == 'redfish':
+            info = dict(info)
+            info.update((yield self._async_ssh_sysinfo()))
+            sysinfo_cache.put(self.address, info)
+        if field not in info:
+            sysinfo_cache.invalidate(self.address)
+            raise Exception("Couldn't find \"" + field + "\" in getsysinfo of: " + self.name)
+        raise Return(info[field])
+
+    def _async_ssh_sysinfo(self):
+        chan = yield self._async_session()
+        try:
+            yield self._async_command_and_wait(chan, "racadm", ">")
+            out = yield self._async_command_and_wait(chan, "getsysinfo", ">")
+        finally:
+            self.cleanup(chan=chan)
+        raise Return(parse_sysinfo(out))
+
+    def _async_job_status(self, chan, job_id):
+        """
+        Coroutine version of _CheckJobStatus
+        """
+        start = time.time()
+        status = None
+        if self.backend == 'redfish':
+            status = yield InThread(self._redfish_call, 'job_status', job_id)
+        if not status:
+            out = yield self._async_command_and_wait(chan, 'racadm jobqueue view -i ' + job_id, '>')
+            status = job_status(parse_jobs(out), job_id)
+        timings.observe('job_status', self.name, time.time() - start)
+        raise Return(status)
+
+    @driver_command
+    def rollout_firmware(self, context, resources, firmware_type, target_version, canary_count='1', wave_size='10'):
+        """
+        Update the firmware of many servers: a canary wave first, then waves of wave_size servers
+        Servers already at target_version are skipped, and running it again resumes an interrupted rollout
+        :param ResourceCommandContext context: the context the command runs on
+        :param str resources: comma separated resource names, empty for every resource of this model in the reservation
+        :param str firmware_type: bios, idrac or lifecycle
+        :param str target_version: version the servers should end up with
+        """
+        self.reservationid = context.reservation.reservation_id
+        self._cs_session(context=context)
+        fw_type = firmware_type.lower()
+        if fw_type not in self.FIRMWARE_IMAGE_SIZE:
+            self._WriteMessage("Bad Input: " + firmware_type)
+            raise Exception("Bad Input: " + firmware_type)
+        names = self._resource_names(context, resources)
+        # The version comes from the user, keep it from adding directories or invalid characters to the path
+        version = re.sub(r'[^\w.-]', '_', target_version.strip())
+        state = RolloutState(ROLLOUT_STATE_PATH.format(firmware_type=fw_type, version=version))
+        bandwidth = float(self.attrs.get("Share Bandwidth") or self.ROLLOUT_SHARE_BANDWIDTH) * 1024 * 1024
+        bucket = share_buckets.setdefault((self.FIRMWARE_SHARE, bandwidth),
+                                          TokenBucket(bandwidth, max(self.FIRMWARE_IMAGE_SIZE.values())))
+        members = {}
+
+        def member(name):
+            if name not in members:
+                members[name] = self._fleet_member(name)
+            return members[name]
+
+        def current_version(name):
+            return member(name)._GetBIOS() if fw_type == 'bios' else member(name)._GetFW()
+
+        def update(name):
+            try:
+                member(name).update_firmware(context, firmware_type)
+            except Exception, e:
+                raise Exception('\n'.join(member(name)._captured + [str(e)]))
+
+        def on_wave(number, wave, results):
+            failed = len([result for result in results if not result.ok])
+            self._WriteMessage(("Canary" if number == 0 and rollout.canary_count else "Wave " + str(number)) + ": " +
+                               str(len(wave) - failed) + " of " + str(len(wave)) + " servers done")
+
+        rollout = FirmwareRollout(names, current_version, update, target_version, state,
+                                  canary_count=int(canary_count or 0), wave_size=max(int(wave_size or 1), 1),
+                                  max_parallel=int(self.attrs.get("Fleet Max Workers") or self.FLEET_MAX_WORKERS),
+                                  max_failure_ratio=float(self.attrs.get("Rollout Max Failure Ratio") or self.ROLLOUT_MAX_FAILURE_RATIO),
+                                  bucket=bucket, image_size=self.FIRMWARE_IMAGE_SIZE[fw_type],
+                                  host_timeout=float(self.attrs.get("Rollout Host Timeout") or self.ROLLOUT_HOST_TIMEOUT))
+        self._logger('Rolling out ' + fw_type + ' ' + target_version + ' to: ' + ', '.join(names))
+        self._WriteMessage("Rolling out " + fw_type + " " + target_version + " to " + str(len(names)) + " servers")
+        completed, reason = rollout.run(on_wave)
+        out = rollout.report()
+        if not completed:
+            out += '\nStopped: ' + reason
+        self._WriteMessage(out)
+        self._logger('Rollout Output: ' + out)
+        if not completed:
+            raise Exception("Rollout stopped: " + reason)
+
+    def _resource_names(self, context, resources):
+        names = [name.strip() for name in resources.split(',') if name.strip()]
+        if not names:
+            details = self.session.GetReservationDetails(self.reservationid).ReservationDescription
+            names = [res.Name for res in details.Resources if res.ResourceModelName == context.resource.model]
+        return names
+
+    @driver_command
+    def refresh_inventory(self, context, resources='', max_age='3600', sections='sysinfo,disks'):
+        """
+        Fetch only the inventory sections that are missing or older than max_age seconds and report what changed
+        :param ResourceCommandContext context: the context the command runs on
+        :param str resources: comma separated resource names, empty for every resource of this model in the reservation
+        :param str sections: comma separated, sysinfo and/or disks
+        """
+        self.reservationid = context.reservation.reservation_id
+        self._cs_session(context=context)
+        wanted = [section.strip().lower() for section in sections.split(',') if section.strip()]
+        for section in wanted:
+            if section not in SECTIONS:
+                self._WriteMessage("Bad Input: " + section)
+                raise Exception("Bad Input: " + section)
+        names = self._resource_names(context, resources)
+        inventory = get_inventory(INVENTORY_PATH)
+        stale = {}
+        for name, section in inventory.stale(names, wanted, float(max_age or 0)):
+            stale.setdefault(name, []).append(section)
+        self._logger('Refreshing inventory of: ' + ', '.join(sorted(stale)))
+
+        def run(name):
+            member = self._fleet_member(name)
+            if 'sysinfo' in stale[name]:
+                sysinfo_cache.invalidate(member.address)
+                member._get_sysinfo()
+            if 'disks' in stale[name]:
+                member._fetch_disks()
+            return ''
+
+        start = time.time()
+        executor = FleetExecutor(int(self.attrs.get("Fleet Max Workers") or self.FLEET_MAX_WORKERS),
+                                 float(self.attrs.get("Fleet Host Timeout") or self.FLEET_HOST_TIMEOUT))
+        results = executor.run(sorted(stale), run)
+        out = ''
+        for result in results:
+            if not result.ok:
+                out += "--- " + result.host + " FAILED: " + result.output + '\n'
+        changes = [change for when, change in inventory.changes(since=start) if change.host in stale]
+        for change in changes:
+            out += change.host + ": " + change.kind + " " + change.item + ": " + str(change.old) + " -> " + str(change.new) + '\n'
+        out += "Refreshed " + str(len(stale)) + " of " + str(len(names)) + " servers, " + \
+               str(len([result for result in results if not result.ok])) + " failed, " + str(len(changes)) + \
+               " changes in {0:.1f}s".format(time.time() - start)
+        self._WriteMessage(out)
+        self._logger('Inventory refresh Output: ' + out)
+
+    @driver_command
+    def show_inventory(self, context, resources=''):
+        """
+        Report the stored inventory without contacting the iDRACs
+        :param ResourceCommandContext context: the context the command runs on
+        :param str resources: comma separated resource names, empty for every resource of this model in the reservation
+        """
+        self.reservationid = context.reservation.reservation_id
+        self._cs_session(context=context)
+        inventory = get_inventory(INVENTORY_PATH)
+        now = time.time()
+        out = ''
+        for name in self._resource_names(context, resources):
+            ages = []
+            for section in SECTIONS:
+                fetched = inventory.fetched(name, section)
+                ages.append(section + (' {0:.0f}m old'.format((now - fetched) / 60) if fetched else ' never fetched'))
+            out += "--- " + name + " (" + ', '.join(ages) + ")" + '\n'
+            info = inventory.sysinfo(name)
+            for field in ("Firmware Version", "System BIOS Version", "OS Name"):
+                if field in info:
+                    out += field + ": " + info[field] + '\n'
+            for kind, disk, size, layout in inventory.disks(name):
+                out += kind.capitalize() + " Disk: " + disk + " Size: " + size + (" Raid Config: " + layout if layout else '') + '\n'
+        self._WriteMessage(out.rstrip('\n') or "No servers")
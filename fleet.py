@@ -0,0 +1,73 @@
+import time
+import threading
+import Queue
+
+
+class HostResult(object):
+    def __init__(self, host, ok, output, elapsed):
+        self.host = host
+        self.ok = ok
+        self.output = output
+        self.elapsed = elapsed
+
+
+class FleetExecutor(object):
+    """
+    Runs one operation against many hosts on a bounded pool of worker threads
+    """
+
+    def __init__(self, max_workers=16, host_timeout=900):
+        self.max_workers = max_workers
+        self.host_timeout = host_timeout
+
+    def run(self, hosts, operation):
+        """
+        Call operation(host) for every host, at most max_workers at a time
+        A host that doesn't finish within host_timeout is reported as failed; its thread is left
+        to end on its own since it can't be interrupted
+        :param list hosts: hosts to run on
+        :param operation: callable returning the host's output
+        :return: list of HostResult, in the order of hosts
+        """
+        tasks = Queue.Queue()
+        for index, host in enumerate(hosts):
+            tasks.put((index, host))
+        results = [None] * len(hosts)
+        workers = []
+        for x in xrange(min(self.max_workers, len(hosts))):
+            worker = threading.Thread(target=self._worker, args=(tasks, operation, results))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        return results
+
+    def _worker(self, tasks, operation, results):
+        while True:
+            try:
+                index, host = tasks.get_nowait()
+            except Queue.Empty:
+                return
+            results[index] = self._run_one(host, operation)
+
+    def _run_one(self, host, operation):
+        outcome = {}
+
+        def target():
+            try:
+                outcome['output'] = operation(host)
+                outcome['ok'] = True
+            except Exception, e:
+                outcome['output'] = str(e)
+                outcome['ok'] = False
+
+        start = time.time()
+        runner = threading.Thread(target=target)
+        runner.daemon = True
+        runner.start()
+        runner.join(self.host_timeout)
+        elapsed = time.time() - start
+        if runner.is_alive():
+            return HostResult(host, False, "Timed out after " + str(self.host_timeout) + " seconds", elapsed)
+        return HostResult(host, outcome['ok'], outcome['output'], elapsed)
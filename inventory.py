@@ -0,0 +1,165 @@
+import time
+import sqlite3
+import threading
+from collections import namedtuple
+
+Change = namedtuple('Change', 'host section kind item old new')
+
+SECTIONS = ('sysinfo', 'disks')
+# getsysinfo fields whose changes are reported; the rest (clock, uptime counters...) change on every read
+WATCHED_FIELDS = {
+    'Firmware Version': 'firmware changed',
+    'System BIOS Version': 'firmware changed',
+    'OS Name': 'os changed',
+    'OS Version': 'os changed',
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sections (host TEXT, section TEXT, fetched REAL, PRIMARY KEY (host, section));
+CREATE TABLE IF NOT EXISTS sysinfo (host TEXT, name TEXT, value TEXT, PRIMARY KEY (host, name));
+CREATE TABLE IF NOT EXISTS disks (host TEXT, kind TEXT, name TEXT, size TEXT, layout TEXT,
+                                  PRIMARY KEY (host, kind, name));
+CREATE TABLE IF NOT EXISTS changes (time REAL, host TEXT, section TEXT, kind TEXT, item TEXT, old TEXT, new TEXT);
+CREATE INDEX IF NOT EXISTS changes_host ON changes (host, time);
+"""
+
+
+class Inventory(object):
+    """
+    SQLite store of the last sysinfo and disks seen on every host, with when each was fetched
+    Updating a section compares it with what is stored and records the differences as changes
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.executescript(_SCHEMA)
+
+    def fetched(self, host, section):
+        """
+        :return: when the section of the host was last stored, None if never
+        """
+        with self._lock:
+            row = self._db.execute('SELECT fetched FROM sections WHERE host = ? AND section = ?',
+                                   (host, section)).fetchone()
+        return row[0] if row else None
+
+    def stale(self, hosts, sections=SECTIONS, max_age=3600):
+        """
+        :return: list of (host, section) missing from the store or older than max_age seconds
+        """
+        now = time.time()
+        out = []
+        for host in hosts:
+            for section in sections:
+                fetched = self.fetched(host, section)
+                if fetched is None or now - fetched > max_age:
+                    out.append((host, section))
+        return out
+
+    def update_sysinfo(self, host, info):
+        """
+        Fields missing from info keep their stored value, since Redfish only reports part of getsysinfo
+        :param dict info: parsed getsysinfo
+        :return: list of Change of the watched fields, empty the first time the host is stored
+        """
+        with self._lock:
+            old = dict(self._db.execute('SELECT name, value FROM sysinfo WHERE host = ?', (host,)))
+            changes = []
+            if self._known(host, 'sysinfo'):
+                for name, kind in sorted(WATCHED_FIELDS.items()):
+                    if name in info and old.get(name) != info[name]:
+                        changes.append(Change(host, 'sysinfo', kind, name, old.get(name), info[name]))
+            with self._db:
+                self._db.executemany('INSERT OR REPLACE INTO sysinfo VALUES (?, ?, ?)',
+                                     [(host, name, value) for name, value in info.items()])
+                self._store(host, 'sysinfo', changes)
+        return changes
+
+    def update_disks(self, host, v_disks, p_disks):
+        """
+        :param v_disks: (names, sizes, layouts) of the virtual disks
+        :param p_disks: (names, sizes) of the physical disks
+        :return: list of Change (disk added, disk removed, disk resized, raid changed), empty the first time
+        """
+        new = {}
+        for name, size, layout in zip(*v_disks):
+            new[('virtual', name.strip())] = (size.strip(), layout.strip())
+        for name, size in zip(*p_disks):
+            new[('physical', name.strip())] = (size.strip(), '')
+        with self._lock:
+            old = dict(((kind, name), (size, layout)) for kind, name, size, layout in
+                       self._db.execute('SELECT kind, name, size, layout FROM disks WHERE host = ?', (host,)))
+            changes = []
+            if self._known(host, 'disks'):
+                for key in sorted(set(old) | set(new)):
+                    item = key[0] + ' ' + key[1]
+                    if key not in new:
+                        changes.append(Change(host, 'disks', 'disk removed', item, old[key][0], None))
+                    elif key not in old:
+                        changes.append(Change(host, 'disks', 'disk added', item, None, new[key][0]))
+                    elif old[key][1] != new[key][1]:
+                        changes.append(Change(host, 'disks', 'raid changed', item, old[key][1], new[key][1]))
+                    elif old[key][0] != new[key][0]:
+                        changes.append(Change(host, 'disks', 'disk resized', item, old[key][0], new[key][0]))
+            with self._db:
+                self._db.execute('DELETE FROM disks WHERE host = ?', (host,))
+                self._db.executemany('INSERT INTO disks VALUES (?, ?, ?, ?, ?)',
+                                     [(host, kind, name, size, layout) for (kind, name), (size, layout) in new.items()])
+                self._store(host, 'disks', changes)
+        return changes
+
+    def sysinfo(self, host):
+        with self._lock:
+            return dict(self._db.execute('SELECT name, value FROM sysinfo WHERE host = ?', (host,)))
+
+    def disks(self, host):
+        """
+        :return: list of (kind, name, size, layout)
+        """
+        with self._lock:
+            return self._db.execute('SELECT kind, name, size, layout FROM disks WHERE host = ? ORDER BY kind, name',
+                                    (host,)).fetchall()
+
+    def changes(self, host=None, since=0):
+        """
+        :return: list of (time, Change), oldest first
+        """
+        query = 'SELECT time, host, section, kind, item, old, new FROM changes WHERE time >= ?'
+        args = [since]
+        if host is not None:
+            query += ' AND host = ?'
+            args.append(host)
+        with self._lock:
+            rows = self._db.execute(query + ' ORDER BY time', args).fetchall()
+        return [(row[0], Change(*row[1:])) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _known(self, host, section):
+        return self._db.execute('SELECT 1 FROM sections WHERE host = ? AND section = ?',
+                                (host, section)).fetchone() is not None
+
+    def _store(self, host, section, changes):
+        now = time.time()
+        self._db.execute('INSERT OR REPLACE INTO sections VALUES (?, ?, ?)', (host, section, now))
+        self._db.executemany('INSERT INTO changes VALUES (?, ?, ?, ?, ?, ?, ?)',
+                             [(now,) + tuple(change) for change in changes])
+
+
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(path):
+    """
+    The process-wide inventory of a database file, opened on first use
+    """
+    with _inventories_lock:
+        if path not in _inventories:
+            _inventories[path] = Inventory(path)
+        return _inventories[path]
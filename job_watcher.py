@@ -0,0 +1,140 @@
+import time
+from reactor import Return, Sleep
+
+
+class JobWatcher(object):
+    """
+    Polls any number of iDRAC jobs through one status callable (e.g. over one channel)
+    The delay between two polls of a job grows while its state stays the same and resets when it changes,
+    and only state changes are reported
+    """
+
+    # Job state -> (first delay, max delay) in seconds between polls
+    BACKOFF = {
+        'New': (5, 30),
+        'Downloading': (5, 30),
+        'Downloaded': (5, 30),
+        'Scheduled': (10, 60),
+        'Running': (15, 120),
+    }
+    DEFAULT_BACKOFF = (5, 60)
+    FACTOR = 2
+
+    def __init__(self, check, on_transition=None):
+        """
+        :param check: callable(job_id) returning (message, status), like DellLifecycleDriver._CheckJobStatus
+        :param on_transition: callable(job_id, message, status) called when a job's status or message changes
+        """
+        self.check = check
+        self.on_transition = on_transition
+        self._jobs = {}
+
+    def add(self, job_id):
+        if job_id not in self._jobs:
+            self._jobs[job_id] = {'message': None, 'status': None, 'delay': 0, 'due': 0}
+
+    def poll(self):
+        """
+        Check every job that is due
+        :return: list of (job_id, message, status) that changed
+        """
+        changed = []
+        for job_id in self._due():
+            message, status = self.check(job_id)
+            if self._record(job_id, message, status):
+                changed.append((job_id, message, status))
+        return changed
+
+    def wait_all(self, job_ids, until=None, timeout=None):
+        """
+        Poll until every job is finished (Completed, Failed or Error) or until(message, status) is true for it
+        :param float timeout: give up after this many seconds and return the last known states
+        :return: dict of job_id -> (message, status)
+        """
+        for job_id in job_ids:
+            self.add(job_id)
+        deadline = time.time() + timeout if timeout else None
+        pending = set(job_ids)
+        while True:
+            self.poll()
+            delay = self._next_poll(pending, until, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+        return self._states(job_ids)
+
+    def watch(self, job_ids, until=None, timeout=None):
+        """
+        Coroutine version of wait_all for a reactor.Reactor, so many watchers share one thread
+        check must return a coroutine here, e.g. one reading the job queue on a channel of the loop
+        """
+        for job_id in job_ids:
+            self.add(job_id)
+        deadline = time.time() + timeout if timeout else None
+        pending = set(job_ids)
+        while True:
+            for job_id in self._due():
+                message, status = yield self.check(job_id)
+                self._record(job_id, message, status)
+            delay = self._next_poll(pending, until, deadline)
+            if delay is None:
+                break
+            yield Sleep(delay)
+        raise Return(self._states(job_ids))
+
+    def wait(self, job_id, until=None, timeout=None):
+        """
+        :return: (message, status) of the job, see wait_all
+        """
+        return self.wait_all([job_id], until, timeout)[job_id]
+
+    def _due(self):
+        now = time.time()
+        return [job_id for job_id, job in self._jobs.items() if job['due'] <= now]
+
+    def _record(self, job_id, message, status):
+        """
+        Schedule the next poll of a job from its latest state
+        :return: True when the state changed
+        """
+        job = self._jobs[job_id]
+        first, most = self._backoff(status)
+        changed = (message, status) != (job['message'], job['status'])
+        if changed:
+            job['message'], job['status'] = message, status
+            job['delay'] = first
+            if self.on_transition:
+                self.on_transition(job_id, message, status)
+        else:
+            job['delay'] = min(job['delay'] * self.FACTOR, most)
+        job['due'] = time.time() + job['delay']
+        return changed
+
+    def _next_poll(self, pending, until, deadline):
+        """
+        Drop the jobs that are done from pending
+        :return: seconds until the next poll is due, None when nothing is left to wait for
+        """
+        for job_id in list(pending):
+            job = self._jobs[job_id]
+            if self.finished(job['status']) or (until and until(job['message'], job['status'])):
+                pending.discard(job_id)
+        if not pending or (deadline and time.time() >= deadline):
+            return None
+        due = min(self._jobs[job_id]['due'] for job_id in pending)
+        if deadline:
+            due = min(due, deadline)
+        return max(due - time.time(), 0)
+
+    def _states(self, job_ids):
+        return dict((job_id, (self._jobs[job_id]['message'], self._jobs[job_id]['status'])) for job_id in job_ids)
+
+    def _backoff(self, status):
+        for state, backoff in self.BACKOFF.items():
+            if state in (status or ''):
+                return backoff
+        return self.DEFAULT_BACKOFF
+
+    @staticmethod
+    def finished(status):
+        return status is not None and ('Completed' in status or 'Failed' in status or 'Error' in status)
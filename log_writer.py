@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import time
+import atexit
+import threading
+import Queue
+from collections import OrderedDict
+
+# Values that follow these are masked even when they were never registered with add_secret
+_SECRET_PATTERNS = [
+    re.compile(r'(-p\s+)(\S+)'),
+    re.compile(r'(Password\s*[:=]\s*)(\S+)', re.I),
+    re.compile(r'(\.Password\s+)(\S+)', re.I),
+    re.compile(r'(password to:\s*)(\S+)', re.I),
+]
+MASK = '******'
+
+
+class LogWriter(object):
+    """
+    Writes JSON-lines log records from a background thread, in batches, with size based rotation
+    Callers only put records on a queue, so logging never waits on the disk
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5, batch_size=200, flush_interval=1.0,
+                 max_secrets=1000):
+        """
+        :param int max_secrets: registered secrets kept, the oldest are forgotten first
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_secrets = max_secrets
+        # Secret -> None, in the order they were last registered
+        self._secrets = OrderedDict()
+        self._secrets_lock = threading.Lock()
+        self._queue = Queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add_secret(self, secret):
+        if secret:
+            secret = _text(secret)
+            with self._secrets_lock:
+                self._secrets.pop(secret, None)
+                self._secrets[secret] = None
+                while len(self._secrets) > self.max_secrets:
+                    self._secrets.popitem(last=False)
+
+    def redact(self, text):
+        # add_secret runs on the command threads while this runs on the writer thread
+        with self._secrets_lock:
+            secrets = list(self._secrets)
+        for secret in secrets:
+            text = text.replace(secret, MASK)
+        for pattern in _SECRET_PATTERNS:
+            text = pattern.sub(lambda m: m.group(1) + MASK, text)
+        return text
+
+    def write(self, record):
+        """
+        :param dict record: fields of one log line, string values are redacted
+        """
+        self._queue.put(record)
+
+    def flush(self):
+        """
+        Block until every queued record is on disk
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.time(), 0)))
+                except Queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception:
+                pass  # logging must never break the driver
+            for x in batch:
+                self._queue.task_done()
+
+    def _write_batch(self, batch):
+        lines = []
+        for record in batch:
+            # One record that can't be serialized must not take the rest of the batch with it
+            try:
+                lines.append(self._serialize(record))
+            except Exception:
+                pass
+        data = ''.join(lines)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, 'a') as f:
+            f.write(data)
+
+    def _serialize(self, record):
+        """
+        :return: the redacted record as one JSON line; bytes that aren't UTF-8 (e.g. from an iDRAC reply) are replaced
+        """
+        record = dict((key, self.redact(_text(value)) if isinstance(value, basestring) else value)
+                      for key, value in record.items())
+        return json.dumps(record, sort_keys=True) + '\n'
+
+    def _rotate(self):
+        for index in xrange(self.backups - 1, 0, -1):
+            older = self.path + '.' + str(index)
+            if os.path.exists(older):
+                newer = self.path + '.' + str(index + 1)
+                if os.path.exists(newer):
+                    os.remove(newer)
+                os.rename(older, newer)
+        os.rename(self.path, self.path + '.1')
+
+
+def _text(value):
+    return value.decode('utf-8', 'replace') if isinstance(value, str) else value
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path):
+    """
+    The process-wide writer of a log file
+    """
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = LogWriter(path)
+        return _writers[path]
+
+
+@atexit.register
+def _flush_all():
+    for writer in _writers.values():
+        writer.flush()
@@ -0,0 +1,143 @@
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from a quick prompt wait up to a firmware job
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+    def observe(self, seconds, ok=True):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if not ok:
+            self.errors += 1
+
+
+class Trace(object):
+    """
+    Self time of every span path of one command invocation, for a flame graph
+    """
+
+    def __init__(self):
+        self.stacks = {}
+
+    def add(self, path, seconds):
+        self.stacks[path] = self.stacks.get(path, 0.0) + seconds
+
+    def folded(self):
+        """
+        :return: "outer;inner microseconds" lines, the collapsed stack format flamegraph.pl and speedscope read
+        """
+        return '\n'.join(path + ' ' + str(int(seconds * 1000000)) for path, seconds in sorted(self.stacks.items()))
+
+
+class Metrics(object):
+    """
+    Latency histograms per (operation, host), filled by span() and exported in the Prometheus text format
+    Spans nest per thread; while a trace is started in a thread its spans are also added to the trace
+    """
+
+    def __init__(self, prefix='dell_idrac', buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+
+    def observe(self, operation, host, seconds, ok=True):
+        key = (operation, host or '')
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds, ok)
+
+    @contextmanager
+    def span(self, operation, host=''):
+        stack = self._stack()
+        # [name, start, seconds spent in child spans]
+        frame = [operation, time.time(), 0.0]
+        stack.append(frame)
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            elapsed = time.time() - frame[1]
+            stack.pop()
+            self.observe(operation, host, elapsed, ok)
+            trace = getattr(self._local, 'trace', None)
+            if trace is not None:
+                trace.add(';'.join([f[0] for f in stack] + [operation]), elapsed - frame[2])
+            if stack:
+                stack[-1][2] += elapsed
+
+    def start_trace(self):
+        """
+        :return: a new Trace for this thread, or None when one is already running (a nested command)
+        """
+        if getattr(self._local, 'trace', None) is not None:
+            return None
+        self._local.trace = Trace()
+        return self._local.trace
+
+    def end_trace(self):
+        self._local.trace = None
+
+    def export(self):
+        """
+        :return: every histogram in the Prometheus text exposition format
+        """
+        name = self.prefix + '_operation_seconds'
+        lines = ['# HELP ' + name + ' Latency of driver operations.', '# TYPE ' + name + ' histogram']
+        errors = []
+        with self._lock:
+            items = sorted((key, (list(h.counts), h.sum, h.count, h.errors)) for key, h in self._histograms.items())
+        for (operation, host), (counts, total, count, failed) in items:
+            labels = 'operation="' + _label(operation) + '",host="' + _label(host) + '"'
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                lines.append(name + '_bucket{' + labels + ',le="' + repr(float(bound)) + '"} ' + str(cumulative))
+            lines.append(name + '_bucket{' + labels + ',le="+Inf"} ' + str(count))
+            lines.append(name + '_sum{' + labels + '} ' + repr(total))
+            lines.append(name + '_count{' + labels + '} ' + str(count))
+            errors.append(self.prefix + '_operation_errors_total{' + labels + '} ' + str(failed))
+        if errors:
+            lines += ['# HELP ' + self.prefix + '_operation_errors_total Driver operations that raised.',
+                      '# TYPE ' + self.prefix + '_operation_errors_total counter'] + errors
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Replace path with the current export, e.g. for the node_exporter textfile collector
+        """
+        text = self.export()
+        with self._write_lock:
+            with open(path + '.tmp', 'w') as f:
+                f.write(text)
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(path + '.tmp', path)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
@@ -0,0 +1,53 @@
+import threading
+
+
+class OutputSink(object):
+    """
+    Coalesces reservation output messages and sends them, in order, with one API call
+    A flush happens once max_lines are buffered, max_age seconds after the oldest buffered message,
+    or when flush() is called at the end of a command
+    """
+
+    def __init__(self, write, max_lines=20, max_age=2.0):
+        """
+        :param write: callable(message) doing the actual WriteMessageToReservationOutput
+        """
+        self.write = write
+        self.max_lines = max_lines
+        self.max_age = max_age
+        self._lines = []
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def add(self, message):
+        with self._lock:
+            self._lines.append(message)
+            if len(self._lines) >= self.max_lines:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.max_age, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Send everything buffered; on failure the messages stay buffered for the next flush
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._lines:
+                return
+            lines, self._lines = self._lines, []
+            try:
+                self.write('\n'.join(lines))
+            except Exception:
+                self._lines = lines + self._lines
+                raise
+
+    def _timed_flush(self):
+        try:
+            self.flush()
+        except Exception:
+            pass  # kept buffered, the command's final flush reports it
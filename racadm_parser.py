@@ -0,0 +1,213 @@
+import re
+from collections import namedtuple
+
+VDisk = namedtuple('VDisk', 'fqdd name size layout status state')
+PDisk = namedtuple('PDisk', 'fqdd name size status state media_type')
+Job = namedtuple('Job', 'job_id name status message percent')
+
+VDISK_FIELDS = ('Name', 'Size', 'Layout', 'Status', 'State')
+PDISK_FIELDS = ('Name', 'Size', 'Status', 'State', 'MediaType')
+JOB_FIELDS = ('Job Name', 'Status', 'Message', 'Percent Complete')
+
+
+def _compile(header, fields, indent=''):
+    """
+    One regex matching, right after a line break, either the header of a record or one of the wanted
+    "Name = Value" lines, so the regex engine scans the reply once and only the interesting lines reach Python
+    Every match is a (record id, name, value) tuple with either the id or the name empty
+    Most lines fail the match, so rejecting them is kept cheap: the indentation racadm prints is matched literally
+    rather than repeated, and the value is taken greedily and stripped by the caller instead of backtracking over
+    trailing blanks
+    :param str indent: the exact indentation of the field lines
+    """
+    key = '|'.join(re.escape(field) for field in fields) if fields else r'[^=\r\n]+?'
+    line = indent + r'(' + key + r') *= *([^\r\n]*)'
+    if header:
+        return re.compile(r'\n(?:' + header + '|' + line + ')')
+    return re.compile(r'\n()' + line)
+
+
+_VDISK = _compile(r'(Disk\.Virtual\.\S+)', VDISK_FIELDS, '   ')
+_PDISK = _compile(r'(Disk\.Bay\.\S+)', PDISK_FIELDS, '   ')
+_JOB = _compile(r'\[?Job ID\s*=\s*(JID_\w+)', JOB_FIELDS)
+_SYSINFO = _compile(None, None)
+
+
+def _vdisk(fqdd, fields):
+    return VDisk(fqdd, fields.get('Name', ''), fields.get('Size', ''), fields.get('Layout', ''),
+                 fields.get('Status', ''), fields.get('State', ''))
+
+
+def _pdisk(fqdd, fields):
+    return PDisk(fqdd, fields.get('Name', ''), fields.get('Size', ''), fields.get('Status', ''),
+                 fields.get('State', ''), fields.get('MediaType', ''))
+
+
+def _job(job_id, fields):
+    return Job(job_id, fields.get('Job Name', ''), fields.get('Status', ''), fields.get('Message', ''),
+               fields.get('Percent Complete', '').strip('[]'))
+
+
+class RecordParser(object):
+    """
+    Single pass parser of racadm "Name = Value" blocks
+    A header line starts a new record; chunks can be fed as they arrive from the channel
+    """
+
+    def __init__(self, pattern, build, single=False):
+        """
+        :param pattern: regex made by _compile
+        :param build: callable(record id, dict of fields) returning the record
+        :param bool single: the whole reply is one record without headers (getsysinfo)
+        """
+        self.pattern = pattern
+        self.build = build
+        self.single = single
+        self._partial = '\n'
+        self._id = None
+        self._fields = {}
+        self._started = single
+
+    def feed(self, chunk):
+        """
+        :return: list of the records completed by this chunk
+        """
+        # The unparsed tail always starts at a line break, which is what the patterns anchor on
+        text = self._partial + chunk
+        end = text.rfind('\n')
+        self._partial = text[end:]
+        return self._scan(text, end)
+
+    def close(self):
+        """
+        :return: list with the last record, if any
+        """
+        text, self._partial = self._partial, '\n'
+        records = self._scan(text, len(text))
+        if self._started:
+            records.append(self.build(self._id, self._fields))
+            self._id, self._fields, self._started = None, {}, self.single
+        return records
+
+    def _scan(self, text, end):
+        records = []
+        fields = self._fields
+        for record_id, key, value in self.pattern.findall(text, 0, end):
+            if record_id:
+                if self._started:
+                    records.append(self.build(self._id, fields))
+                self._id, fields, self._started = record_id, {}, True
+                self._fields = fields
+            elif self._started and key not in fields:
+                fields[key] = value.rstrip()
+        return records
+
+
+def vdisk_parser():
+    return RecordParser(_VDISK, _vdisk)
+
+
+def pdisk_parser():
+    return RecordParser(_PDISK, _pdisk)
+
+
+def job_parser():
+    return RecordParser(_JOB, _job)
+
+
+def sysinfo_parser():
+    return RecordParser(_SYSINFO, lambda record_id, fields: fields, single=True)
+
+
+def _parse(parser, text):
+    return parser.feed(text) + parser.close()
+
+
+def parse_vdisks(text):
+    """
+    :param str text: raw reply of racadm raid get vdisks -o
+    :rtype: list of VDisk
+    """
+    return _parse(vdisk_parser(), text)
+
+
+def parse_pdisks(text):
+    """
+    :param str text: raw reply of racadm raid get pdisks -o
+    :rtype: list of PDisk
+    """
+    return _parse(pdisk_parser(), text)
+
+
+def parse_jobs(text):
+    """
+    :param str text: raw reply of racadm jobqueue view (with or without -i)
+    :rtype: list of Job
+    """
+    return _parse(job_parser(), text)
+
+
+def parse_sysinfo(text):
+    """
+    Turn a getsysinfo reply into a dict of every "Name = Value" field
+    When a name repeats in several sections the first one wins, like the old split() parsing did
+    :param str text: raw reply of racadm getsysinfo
+    :rtype: dict
+    """
+    return _parse(sysinfo_parser(), text)[0]
+
+
+def job_status(jobs, job_id):
+    """
+    :param jobs: Job records, e.g. from a streamed job_parser()
+    :return: (message, status) of the job, status is 'Error' when it isn't listed
+    """
+    for job in jobs:
+        if job.job_id == job_id.strip():
+            return job.message, job.status
+    return "Couldn't find job: " + job_id, 'Error'
+
+
+def find_job(text, *words):
+    """
+    Find the last job of a racadm jobqueue view reply that mentions every word in its name, status or message
+    :return: (job_id, message), both empty when there is none
+    """
+    job_id, message = '', ''
+    for job in parse_jobs(text):
+        described = ' '.join((job.name, job.status, job.message))
+        if all(word in described for word in words):
+            job_id, message = job.job_id, job.message
+    return job_id, message
+
+
+def split_pipelined(text, prompt, commands, markers):
+    """
+    Split the transcript of pipelined commands, each sent followed by a marker line the shell rejects, into replies
+    The shell ends every reply with its prompt, so the text between prompts alternates between the reply of a command
+    and the error reply of its marker, whether the terminal echoed each line right before its reply or all of them
+    up front
+    :param str prompt: the exact shell prompt
+    :return: list of replies, each as its command line followed by the reply and prompt like a command run on its own;
+             None when the transcript doesn't hold a reply and a marker error for every command
+    """
+    segments = text.split(prompt)
+    if len(segments) <= 2 * len(commands):
+        return None
+    replies = []
+    end = 0
+    for x, (command, marker) in enumerate(zip(commands, markers)):
+        reply = segments[2 * x]
+        end += len(reply) + len(segments[2 * x + 1]) + 2 * len(prompt)
+        if text.find(marker, 0, end) < 0:
+            return None
+        # Lines echoed up front come before the first reply, the last marker line ends them
+        echoed = reply.rfind(markers[-1])
+        if echoed >= 0:
+            newline = reply.find('\n', echoed)
+            reply = reply[newline + 1:] if newline >= 0 else ''
+        # Long commands may be wrapped when echoed, so only look for the start of the command
+        if not reply.lstrip().startswith(command[:40]):
+            reply = command + '\r\n' + reply.lstrip(' ')
+        replies.append(reply + prompt)
+    return replies
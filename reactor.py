@@ -0,0 +1,283 @@
+import re
+import sys
+import time
+import heapq
+import select
+import threading
+import types
+import Queue
+from collections import deque
+from paramiko.pipe import make_pipe
+from receive_buffer import ReceiveBuffer
+
+
+class Return(Exception):
+    """
+    Raised by a coroutine to hand its result to the caller (generators can't return values)
+    """
+
+    def __init__(self, value=None):
+        Exception.__init__(self)
+        self.value = value
+
+
+class Sleep(object):
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+
+class WaitReadable(object):
+    """
+    Resume with True once the channel has data, or with False after timeout seconds
+    """
+
+    def __init__(self, chan, timeout):
+        self.chan = chan
+        self.timeout = timeout
+
+
+class InThread(object):
+    """
+    Run a blocking call (e.g. the paramiko handshake) in a helper thread and resume with its result
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+
+class Timeout(Exception):
+    pass
+
+
+class Task(object):
+    def __init__(self, coro, deadline=None):
+        self.stack = [coro]
+        self.deadline = deadline
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.done = False
+        self.result = None
+        self.error = None
+        # Bumped whenever the task suspends, so a wake-up meant for an earlier wait is ignored
+        self.wait = 0
+
+
+class Reactor(object):
+    """
+    Single-threaded loop driving generator coroutines over many paramiko channels with select()
+    A coroutine yields Sleep, WaitReadable, InThread or another coroutine, and finishes with raise Return(value)
+    Spans of the shared Metrics are per thread, so coroutines time their steps with Metrics.observe instead
+    """
+
+    def __init__(self, max_threads=16):
+        """
+        :param int max_threads: blocking calls run at once, the others queue for a helper thread
+        """
+        self.max_threads = max_threads
+        self._ready = deque()
+        self._timers = []
+        self._readers = {}
+        self._threads = 0
+        self._backlog = deque()
+        self._finished = Queue.Queue()
+        self._wakeup = make_pipe()
+        self._seq = 0
+        # Tasks not done yet; the timers may still hold the deadlines of finished ones
+        self._running = 0
+
+    def spawn(self, coro, timeout=None):
+        """
+        :param float timeout: seconds after which a Timeout is raised in the task where it waits; a blocking call
+                              in a helper thread can't be interrupted, so it only applies once that call returns
+        """
+        task = Task(coro, time.time() + timeout if timeout else None)
+        self._running += 1
+        self._ready.append((task, None, None))
+        return task
+
+    def run(self, until=None):
+        """
+        Run until every task is done, or only until the given task is done
+        """
+        while True:
+            while self._ready:
+                self._step(*self._ready.popleft())
+            if until is not None and until.done:
+                return
+            if not self._running:
+                return
+            self._wait()
+
+    def run_until_complete(self, coro, timeout=None):
+        task = self.spawn(coro, timeout)
+        self.run(until=task)
+        if task.error:
+            raise task.error[0], task.error[1], task.error[2]
+        return task.result
+
+    def _step(self, task, value, error):
+        gen = task.stack[-1]
+        try:
+            if error:
+                yielded = gen.throw(*error)
+            else:
+                yielded = gen.send(value)
+        except Return, r:
+            self._finish(task, r.value, None)
+            return
+        except StopIteration:
+            self._finish(task, None, None)
+            return
+        except Exception:
+            self._finish(task, None, sys.exc_info())
+            return
+        if isinstance(yielded, types.GeneratorType):
+            task.stack.append(yielded)
+            self._ready.append((task, None, None))
+            return
+        task.wait += 1
+        if isinstance(yielded, InThread):
+            if self._threads < self.max_threads:
+                self._start_thread(task, yielded)
+            else:
+                self._backlog.append((task, yielded))
+            return
+        if not isinstance(yielded, (Sleep, WaitReadable)):
+            error = TypeError("Can't yield " + repr(yielded) + " from a coroutine")
+            self._ready.append((task, None, (TypeError, error, None)))
+            return
+        if task.deadline is not None:
+            if task.deadline <= time.time():
+                self._timeout(task)
+                return
+            self._schedule(task.deadline, task, timeout=True)
+        if isinstance(yielded, Sleep):
+            self._schedule(time.time() + yielded.seconds, task)
+        else:
+            self._readers[task] = (yielded.chan, time.time() + yielded.timeout)
+
+    def close(self):
+        self._wakeup.close()
+
+    def _finish(self, task, value, error):
+        task.stack.pop()
+        if task.stack:
+            self._ready.append((task, value, error))
+        else:
+            self._running -= 1
+            task.done = True
+            task.result = value
+            task.error = error
+            task.elapsed = time.time() - task.started
+
+    def _schedule(self, when, task, timeout=False):
+        self._seq += 1
+        heapq.heappush(self._timers, (when, self._seq, task, task.wait, timeout))
+
+    def _resume(self, task, value, error=None):
+        task.wait += 1
+        self._ready.append((task, value, error))
+
+    def _timeout(self, task):
+        self._readers.pop(task, None)
+        error = Timeout("Timed out after " + str(round(task.deadline - task.started, 1)) + " seconds")
+        self._resume(task, None, (Timeout, error, None))
+
+    def _start_thread(self, task, call):
+        self._threads += 1
+        worker = threading.Thread(target=self._in_thread, args=(task, call))
+        worker.daemon = True
+        worker.start()
+
+    def _in_thread(self, task, call):
+        try:
+            self._finished.put((task, call.func(*call.args), None))
+        except Exception:
+            self._finished.put((task, None, sys.exc_info()))
+        self._wakeup.set()
+
+    def _wait(self):
+        now = time.time()
+        deadlines = [deadline for chan, deadline in self._readers.values()]
+        if self._timers:
+            deadlines.append(self._timers[0][0])
+        timeout = max(min(deadlines) - now, 0) if deadlines else None
+        channels = [chan for chan, deadline in self._readers.values()]
+        readable, _, _ = select.select(channels + [self._wakeup], [], [], timeout)
+        now = time.time()
+        for task, (chan, deadline) in self._readers.items():
+            if chan in readable or chan.recv_ready() or chan.closed:
+                del self._readers[task]
+                self._resume(task, True)
+            elif deadline <= now:
+                del self._readers[task]
+                self._resume(task, False)
+        while self._timers and self._timers[0][0] <= now:
+            when, seq, task, wait, timeout = heapq.heappop(self._timers)
+            if task.done or wait != task.wait:
+                continue
+            if timeout:
+                self._timeout(task)
+            else:
+                self._resume(task, None)
+        if self._wakeup in readable:
+            self._wakeup.clear()
+        while True:
+            try:
+                task, value, error = self._finished.get_nowait()
+            except Queue.Empty:
+                break
+            self._threads -= 1
+            self._resume(task, value, error)
+        while self._backlog and self._threads < self.max_threads:
+            self._start_thread(*self._backlog.popleft())
+
+
+def read_until(chan, expect, timeout, on_chunk=None, overlap=256, until=None, max_size=None):
+    """
+    Coroutine version of DellLifecycleDriver._read_until
+    :return: everything received while waiting, close() it when done
+    :rtype: ReceiveBuffer
+    """
+    prompt = re.compile('(?:' + expect + r')\s*$')
+    deadline = time.time() + timeout
+    buff = ReceiveBuffer(overlap=overlap, max_size=max_size)
+    try:
+        while not (until() if until else buff.search(prompt)):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise Exception("Timed out after " + str(timeout) + " seconds waiting for: " + expect)
+            if not chan.recv_ready():
+                if chan.closed or chan.exit_status_ready():
+                    raise Exception("Channel closed while waiting for: " + expect)
+                yield WaitReadable(chan, remaining)
+                continue
+            resp = chan.recv(9999)
+            if not resp:
+                raise Exception("Channel closed while waiting for: " + expect)
+            buff.append(resp)
+            if on_chunk:
+                on_chunk(resp)
+    except Exception:
+        buff.close()
+        raise
+    raise Return(buff)
+
+
+def reconnect(connect, retries=10, delay=20, on_error=None):
+    """
+    Run the connect() coroutine until it succeeds, sleeping on the loop between attempts
+    :param on_error: called with (attempt number, exception) after every failed attempt
+    """
+    for x in xrange(retries):
+        try:
+            result = yield connect()
+        except Exception, e:
+            if on_error:
+                on_error(x, e)
+            if x == retries - 1:
+                raise
+            yield Sleep(delay)
+        else:
+            raise Return(result)
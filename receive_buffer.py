@@ -0,0 +1,81 @@
+import os
+import tempfile
+
+
+class ReceiveBuffer(object):
+    """
+    bytearray backed buffer for a command's reply
+    search() only looks at the data that arrived since the previous search plus an overlap window, so waiting
+    for a prompt stays linear in the reply size; past max_size the head of the reply spills to a temporary file
+    """
+
+    def __init__(self, overlap=256, max_size=None):
+        """
+        :param int overlap: bytes before the new data that a match may start in (longer than any prompt)
+        :param int max_size: bytes kept in memory before spilling to disk, None to never spill
+        """
+        self.overlap = overlap
+        self.max_size = max_size
+        self._data = bytearray()
+        self._searched = 0
+        self._spill = None
+        self._spilled = 0
+
+    def __len__(self):
+        return self._spilled + len(self._data)
+
+    def append(self, data):
+        self._data.extend(data)
+        if self.max_size is not None and len(self._data) > self.max_size:
+            self._spill_head()
+
+    def search(self, pattern):
+        """
+        :param pattern: compiled regex, matched against the tail only
+        """
+        start = max(self._searched - self.overlap, 0)
+        self._searched = len(self._data)
+        return pattern.search(self._data, start)
+
+    def chunks(self, size=65536):
+        """
+        Iterate over the whole reply without loading a spilled head into memory at once
+        """
+        if self._spill is not None:
+            self._spill.seek(0)
+            while True:
+                chunk = self._spill.read(size)
+                if not chunk:
+                    break
+                yield chunk
+        for start in xrange(0, len(self._data), size):
+            yield str(self._data[start:start + size])
+
+    def getvalue(self):
+        return ''.join(self.chunks())
+
+    def tail(self, size):
+        """
+        The last size bytes, for logging; the part that already spilled is read back from the end of the file
+        """
+        missing = min(size - len(self._data), self._spilled)
+        if missing <= 0:
+            return str(self._data[-size:])
+        self._spill.seek(self._spilled - missing)
+        return self._spill.read(missing) + str(self._data)
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _spill_head(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix='racadm-')
+        keep = self.overlap
+        head = len(self._data) - keep
+        self._spill.seek(0, os.SEEK_END)
+        self._spill.write(self._data[:head])
+        del self._data[:head]
+        self._spilled += head
+        self._searched = max(self._searched - head, 0)
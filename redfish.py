@@ -0,0 +1,159 @@
+import functools
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    requests.packages.urllib3.disable_warnings()  # iDRACs ship with self-signed certificates
+except AttributeError:
+    pass
+
+
+class RedfishError(Exception):
+    pass
+
+
+def _checked(func):
+    """
+    Report a reply missing the expected fields or of the wrong type as a RedfishError, so the driver falls back to SSH
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        except (KeyError, TypeError, AttributeError), e:
+            raise RedfishError("Unexpected Redfish reply in " + func.__name__ + ": " + type(e).__name__ + " " + str(e))
+    return wrapper
+
+
+class RedfishClient(object):
+    """
+    iDRAC Redfish REST client over keep-alive HTTPS sessions shared per (URL, user)
+    """
+
+    SYSTEM = '/redfish/v1/Systems/System.Embedded.1'
+    MANAGER = '/redfish/v1/Managers/iDRAC.Embedded.1'
+    ACCOUNT = '/redfish/v1/AccountService/Accounts/2'
+    # power_control operation -> ComputerSystem.Reset type
+    RESET_TYPES = {
+        'start': 'On',
+        'stop': 'ForceOff',
+        'reboot': 'PowerCycle',
+        'hardreset': 'ForceRestart',
+    }
+
+    _sessions = {}
+    _lock = threading.Lock()
+
+    def __init__(self, address, user, password, url=None, timeout=30, verify=False):
+        """
+        :param str url: base URL to use instead of https://<address>, e.g. a local mock server
+        """
+        self.base_url = (url or 'https://' + address).rstrip('/')
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.verify = verify
+
+    def _session(self):
+        key = (self.base_url, self.user)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                session.headers.update({'Accept': 'application/json'})
+                self._sessions[key] = session
+        session.auth = (self.user, self.password)
+        return session
+
+    def _request(self, method, path, body=None):
+        try:
+            resp = self._session().request(method, self.base_url + path, json=body, timeout=self.timeout,
+                                           verify=self.verify)
+        except requests.RequestException, e:
+            raise RedfishError("Redfish " + method + " " + path + " failed: " + str(e))
+        if resp.status_code >= 400:
+            raise RedfishError("Redfish " + method + " " + path + " returned " + str(resp.status_code) + ": " + resp.text)
+        if not resp.content:
+            return {}
+        try:
+            return resp.json()
+        except ValueError:
+            raise RedfishError("Redfish " + method + " " + path + " returned invalid JSON")
+
+    def get(self, path):
+        return self._request('GET', path)
+
+    @_checked
+    def get_sysinfo(self):
+        """
+        Version and model fields named like their getsysinfo counterparts
+        The OS name isn't exposed without the iDRAC Service Module, so it is left out
+        :rtype: dict
+        """
+        system = self.get(self.SYSTEM)
+        manager = self.get(self.MANAGER)
+        info = {
+            'System BIOS Version': system.get('BiosVersion'),
+            'System Model': system.get('Model'),
+            'Service Tag': system.get('SKU'),
+            'Power Status': system.get('PowerState'),
+            'Firmware Version': manager.get('FirmwareVersion'),
+        }
+        if system.get('HostName'):
+            info['Host Name'] = system['HostName']
+        return dict((name, value) for name, value in info.items() if value is not None)
+
+    @_checked
+    def power(self, operation):
+        """
+        :param str operation: a power_control operation
+        :return: a line in the style of racadm serveraction
+        """
+        if operation == 'status':
+            state = self.get(self.SYSTEM).get('PowerState', 'Unknown')
+            return "Server power status: " + state.upper()
+        self._request('POST', self.SYSTEM + '/Actions/ComputerSystem.Reset',
+                      {'ResetType': self.RESET_TYPES[operation.lower()]})
+        return "Server power operation successful"
+
+    @_checked
+    def get_disks(self):
+        """
+        :return: ((vdisk names, sizes, layouts), (pdisk names, sizes)), like _get_v_disks and _get_p_disks
+        """
+        v_names, v_sizes, v_raids = [], [], []
+        p_names, p_sizes = [], []
+        for member in self.get(self.SYSTEM + '/Storage').get('Members', []):
+            controller = self.get(member['@odata.id'])
+            for drive in controller.get('Drives', []):
+                disk = self.get(drive['@odata.id'])
+                p_names.append(disk.get('Name', disk.get('Id', '')))
+                p_sizes.append(self._size(disk.get('CapacityBytes')))
+            if 'Volumes' in controller:
+                for volume in self.get(controller['Volumes']['@odata.id']).get('Members', []):
+                    disk = self.get(volume['@odata.id'])
+                    v_names.append(disk.get('Name', disk.get('Id', '')))
+                    v_sizes.append(self._size(disk.get('CapacityBytes')))
+                    v_raids.append(disk.get('RAIDType') or disk.get('VolumeType', ''))
+        return (v_names, v_sizes, v_raids), (p_names, p_sizes)
+
+    @_checked
+    def job_status(self, job_id):
+        """
+        :return: (message, status), like _CheckJobStatus
+        """
+        job = self.get(self.MANAGER + '/Jobs/' + job_id.strip())
+        return job.get('Message', ''), job.get('JobState', 'Error')
+
+    def set_password(self, password):
+        self._request('PATCH', self.ACCOUNT, {'Password': password})
+        return True
+
+    @staticmethod
+    def _size(capacity):
+        if capacity is None:
+            return ''
+        # racadm reports binary gigabytes with two decimals
+        return '{0:.2f} GB'.format(capacity / float(1024 ** 3))
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import threading
+from distutils.version import LooseVersion
+from fleet import FleetExecutor
+
+UPDATED = 'updated'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+PENDING = 'pending'
+
+
+def at_version(current, target):
+    """
+    True when current is the target version or newer
+    """
+    return LooseVersion(current) >= LooseVersion(target)
+
+
+class RolloutState(object):
+    """
+    Per host progress of a rollout, saved to a JSON file after every change so an interrupted rollout can resume
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.hosts = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.hosts = json.load(f)
+
+    def status(self, host):
+        return self.hosts.get(host, {}).get('status', PENDING)
+
+    def set(self, host, status, detail=''):
+        with self._lock:
+            self.hosts[host] = {'status': status, 'detail': detail, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+            if self.path:
+                with open(self.path + '.tmp', 'w') as f:
+                    json.dump(self.hosts, f, indent=2, sort_keys=True)
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                os.rename(self.path + '.tmp', self.path)
+
+
+class TokenBucket(object):
+    """
+    Limits the bytes started per second from one share: every download takes its image size from the bucket,
+    which refills at rate bytes per second
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._stamp = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount):
+        """
+        Block until amount bytes may start downloading
+        """
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FirmwareRollout(object):
+    """
+    Updates many hosts in waves: a canary wave first, then waves of wave_size hosts, each wave running at most
+    max_parallel updates at once; hosts already at the target version are skipped and the rollout stops when
+    a wave fails too often
+    """
+
+    def __init__(self, hosts, current_version, update, target_version, state, canary_count=1, wave_size=10,
+                 max_parallel=4, max_failure_ratio=0.2, bucket=None, image_size=0, host_timeout=3600):
+        """
+        :param current_version: callable(host) returning the installed version
+        :param update: callable(host) running the update and returning its output
+        :param RolloutState state: progress of earlier runs is honoured
+        :param TokenBucket bucket: download bandwidth limit of the share, None for no limit
+        """
+        self.hosts = hosts
+        self.current_version = current_version
+        self.update = update
+        self.target_version = target_version
+        self.state = state
+        self.canary_count = canary_count
+        self.wave_size = wave_size
+        self.max_parallel = max_parallel
+        self.max_failure_ratio = max_failure_ratio
+        self.bucket = bucket
+        self.image_size = image_size
+        self.host_timeout = host_timeout
+
+    def waves(self):
+        todo = [host for host in self.hosts if self.state.status(host) not in (UPDATED, SKIPPED)]
+        waves = []
+        if self.canary_count:
+            waves.append(todo[:self.canary_count])
+            todo = todo[self.canary_count:]
+        for start in xrange(0, len(todo), self.wave_size):
+            waves.append(todo[start:start + self.wave_size])
+        return [wave for wave in waves if wave]
+
+    def run(self, on_wave=None):
+        """
+        :param on_wave: called with (wave number, hosts, results) after every wave
+        :return: (completed, reason) - reason tells why the rollout stopped early
+        """
+        executor = FleetExecutor(self.max_parallel, self.host_timeout)
+        for number, wave in enumerate(self.waves()):
+            results = executor.run(wave, self._update_host)
+            for result in results:
+                if not result.ok:
+                    self.state.set(result.host, FAILED, result.output)
+            if on_wave:
+                on_wave(number, wave, results)
+            failed = len([result for result in results if not result.ok])
+            if number == 0 and self.canary_count and failed:
+                return False, "Canary wave failed"
+            if failed > self.max_failure_ratio * len(wave):
+                return False, "Wave " + str(number) + " failed on " + str(failed) + " of " + str(len(wave)) + " hosts"
+        return True, ''
+
+    def report(self):
+        counts = {}
+        lines = []
+        for host in self.hosts:
+            status = self.state.status(host)
+            counts[status] = counts.get(status, 0) + 1
+            detail = self.state.hosts.get(host, {}).get('detail', '')
+            lines.append(host + ': ' + status + (' - ' + detail if detail else ''))
+        summary = ', '.join(str(counts[status]) + ' ' + status for status in sorted(counts))
+        return '\n'.join(lines + ['Rollout to ' + self.target_version + ': ' + summary])
+
+    def _update_host(self, host):
+        version = self.current_version(host)
+        if at_version(version, self.target_version):
+            self.state.set(host, SKIPPED, 'already at ' + version)
+            return 'already at ' + version
+        if self.bucket:
+            self.bucket.acquire(self.image_size)
+        self.update(host)
+        version = self.current_version(host)
+        if not at_version(version, self.target_version):
+            raise Exception("still at " + version + " after the update")
+        self.state.set(host, UPDATED, 'now at ' + version)
+        return 'now at ' + version
@@ -0,0 +1,36 @@
+import time
+import threading
+
+
+class SysInfoCache(object):
+    """
+    Per-resource cache of parsed getsysinfo snapshots, so version queries don't go to the iDRAC every time
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, max_age=None):
+        """
+        :return: the cached snapshot, or None when missing or older than max_age (default: ttl) seconds
+        """
+        max_age = self.ttl if max_age is None else max_age
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored, info = entry
+            if time.time() - stored > max_age:
+                del self._entries[key]
+                return None
+            return info
+
+    def put(self, key, info):
+        with self._lock:
+            self._entries[key] = (time.time(), info)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
@@ -0,0 +1,51 @@
+import unittest
+
+try:
+    from cloudshell.api.common_cloudshell_api import CloudShellAPIError
+    from api_cache import APISessionCache
+except ImportError:  # the CloudShell packages are only installed where the driver is deployed
+    CloudShellAPIError = None
+
+
+class FakeSession(object):
+    """
+    Fails its calls with the queued errors, then answers them
+    """
+    logins = 0
+
+    def __init__(self, server_address, token_id, domain):
+        FakeSession.logins += 1
+        self.errors = []
+
+    def GetResourceDetails(self, name):
+        if self.errors:
+            raise self.errors.pop(0)
+        return name
+
+
+@unittest.skipIf(CloudShellAPIError is None, "needs the CloudShell packages")
+class ReconnectingSessionTest(unittest.TestCase):
+
+    def setUp(self):
+        FakeSession.logins = 0
+        self.cache = APISessionCache(FakeSession)
+        self.session = self.cache.get('localhost', 'token')
+
+    def test_shared(self):
+        self.assertIs(self.cache.get('localhost', 'token'), self.session)
+        self.assertEqual(FakeSession.logins, 1)
+
+    def test_expired_session_logs_in_again(self):
+        self.session._session.errors.append(CloudShellAPIError('100', 'Invalid token', ''))
+        self.assertEqual(self.session.GetResourceDetails('dell1'), 'dell1')
+        self.assertEqual(FakeSession.logins, 2)
+
+    def test_other_errors_are_not_retried(self):
+        # A message that mentions a login is not an expired session
+        self.session._session.errors.append(CloudShellAPIError('101', 'Resource dell1 login attribute is missing', ''))
+        self.assertRaises(CloudShellAPIError, self.session.GetResourceDetails, 'dell1')
+        self.assertEqual(FakeSession.logins, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
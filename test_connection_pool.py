@@ -0,0 +1,117 @@
+import os
+import sys
+import socket
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from fake_idrac import FakeIDRACServer, USER, PASSWORD
+from connection_pool import SSHConnectionPool
+try:
+    import driver
+except ImportError:  # the CloudShell packages are only installed where the driver is deployed
+    driver = None
+
+ADDRESS = '127.0.0.1'
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind((ADDRESS, 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class SSHConnectionPoolTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = FakeIDRACServer(1, ADDRESS, free_port(), latency=0).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.pool = SSHConnectionPool(max_per_host=2, connect_timeout=5)
+        self.key = (ADDRESS, self.server.port, USER)
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def acquire(self, password=PASSWORD, timeout=None):
+        return self.pool.acquire(ADDRESS, USER, password, self.server.port, timeout)
+
+    def release(self, client, broken=False):
+        self.pool.release(client, ADDRESS, USER, self.server.port, broken)
+
+    def test_reuse(self):
+        client = self.acquire()
+        self.assertEqual(self.pool._in_use[self.key], 1)
+        self.release(client)
+        self.assertEqual(self.pool._in_use[self.key], 0)
+        self.assertIs(self.acquire(), client)
+
+    def test_limit_per_host(self):
+        first, second = self.acquire(), self.acquire()
+        self.assertRaises(Exception, self.acquire, timeout=0.2)
+        self.release(first)
+        self.assertIs(self.acquire(timeout=0.2), first)
+        self.release(second, broken=True)
+        self.assertIsNot(self.acquire(timeout=0.2), second)
+
+    def test_failed_connect_frees_its_slot(self):
+        for x in xrange(3):
+            self.assertRaises(Exception, self.acquire, 'wrong')
+        self.assertEqual(self.pool._in_use[self.key], 0)
+        self.acquire(timeout=0.2)
+        self.acquire(timeout=0.2)
+
+    def test_discard(self):
+        client = self.acquire()
+        self.release(client)
+        self.pool.discard(ADDRESS, USER, self.server.port)
+        self.assertIsNot(self.acquire(), client)
+
+
+@unittest.skipIf(driver is None, "the driver needs the CloudShell packages")
+class DriverSessionLeakTest(unittest.TestCase):
+    """
+    A failing command must give its pooled connection back, or the pool runs dry after max_per_host failures
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # Replies take longer than the driver waits, so every command times out
+        cls.server = FakeIDRACServer(1, ADDRESS, free_port(), latency=0.5).start()
+        cls.cwd = os.getcwd()
+        cls.temp = tempfile.mkdtemp()
+        os.chdir(cls.temp)  # the driver's log goes to a relative path off Windows
+
+    @classmethod
+    def tearDownClass(cls):
+        driver.get_writer(driver.LOG_PATH).flush()
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.temp)
+        cls.server.stop()
+
+    def test_failures_release_the_session(self):
+        dell = driver.DellLifecycleDriver()
+        dell._decrypt = lambda encrypted: PASSWORD
+        dell.name, dell.address = 'dell1', ADDRESS
+        dell._load_attributes({'User': USER, 'Password': 'encrypted', 'SSH Port': str(self.server.port),
+                               'Command Timeout': '0.2'})
+        for x in xrange(driver.ssh_pool.max_per_host + 1):
+            try:
+                dell._fetch_disks()
+            except Exception, e:
+                self.assertIn('Timed out after', str(e))
+            else:
+                self.fail("The command didn't time out")
+        self.assertEqual(driver.ssh_pool._in_use[(ADDRESS, self.server.port, USER)], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
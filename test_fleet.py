@@ -0,0 +1,133 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+from fleet import FleetExecutor
+from reactor import Sleep
+try:
+    import driver
+except ImportError:  # the CloudShell packages are only installed where the driver is deployed
+    driver = None
+
+
+class FleetExecutorTest(unittest.TestCase):
+
+    def test_order(self):
+        # Later hosts finish first, the results still follow the hosts
+        delays = {'idrac0': 0.06, 'idrac1': 0.03, 'idrac2': 0.0, 'idrac3': 0.01}
+
+        def operation(host):
+            time.sleep(delays[host])
+            return host + ' done'
+        results = FleetExecutor(max_workers=4, host_timeout=5).run(sorted(delays), operation)
+        self.assertEqual([(result.host, result.ok, result.output) for result in results],
+                         [(host, True, host + ' done') for host in sorted(delays)])
+
+    def test_errors(self):
+        def operation(host):
+            if host != 'idrac1':
+                raise Exception('No route to ' + host)
+            return 'ok'
+        results = FleetExecutor(max_workers=2, host_timeout=5).run(['idrac0', 'idrac1', 'idrac2'], operation)
+        self.assertEqual([(result.ok, result.output) for result in results],
+                         [(False, 'No route to idrac0'), (True, 'ok'), (False, 'No route to idrac2')])
+
+    def test_host_timeout(self):
+        release = threading.Event()
+
+        def operation(host):
+            if host == 'stuck':
+                release.wait(5)
+            return host
+        start = time.time()
+        try:
+            results = FleetExecutor(max_workers=2, host_timeout=0.1).run(['stuck', 'idrac1', 'idrac2'], operation)
+        finally:
+            release.set()
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([(result.ok, result.output) for result in results],
+                         [(False, 'Timed out after 0.1 seconds'), (True, 'idrac1'), (True, 'idrac2')])
+        self.assertGreaterEqual(results[0].elapsed, 0.1)
+
+    def test_max_workers(self):
+        running = [0, 0]
+        lock = threading.Lock()
+
+        def operation(host):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+        results = FleetExecutor(max_workers=3, host_timeout=5).run(range(10), operation)
+        self.assertTrue(all(result.ok for result in results))
+        self.assertEqual(running[1], 3)
+
+
+if driver is not None:
+    class EchoDriver(driver.DellLifecycleDriver):
+        """
+        Adds a fleet operation that only writes messages, so no server is needed
+        """
+        FLEET_OPERATIONS = dict(driver.DellLifecycleDriver.FLEET_OPERATIONS, echo='_fleet_echo')
+
+        def _fleet_echo(self, context, argument):
+            self._WriteMessage('Checking ' + self.name + ' at ' + self.address)
+            yield Sleep(0.01)
+            if self.name in argument.split(','):
+                raise Exception('Failed on ' + self.name)
+            self._WriteMessage('Done')
+
+
+@unittest.skipIf(driver is None, "the driver needs the CloudShell packages")
+class RunOnFleetCaptureTest(unittest.TestCase):
+    """
+    Every member's messages go into its own part of the report, also when it fails
+    """
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.temp = tempfile.mkdtemp()
+        os.chdir(self.temp)  # the driver's log goes to a relative path off Windows
+
+    def tearDown(self):
+        driver.get_writer(driver.LOG_PATH).flush()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.temp)
+
+    def test_capture(self):
+        class Session(object):
+            def GetResourceDetails(self, name):
+                return Namespace(Address='10.0.0.' + name[-1],
+                                 ResourceAttributes=[Namespace(Name='Dell.User', Value='root'),
+                                                     Namespace(Name='Dell.Password', Value='encrypted')])
+        dell = EchoDriver()
+        dell._decrypt = lambda encrypted: 'calvin'
+        dell._cs_session = lambda context: None
+        dell.name, dell.address, dell.session = 'fleet', '10.0.0.9', Session()
+        dell._load_attributes({'User': 'root', 'Password': 'encrypted'})
+        dell._captured = []
+        dell.run_on_fleet(Namespace(reservation=Namespace(reservation_id='test')), 'idrac0,idrac1,idrac2', 'echo',
+                          'idrac1')
+        self.assertEqual(dell._captured[0], 'Running echo on 3 servers')
+        lines = dell._captured[-1].splitlines()
+        self.assertTrue(lines[0].startswith('--- idrac0 OK ('))
+        self.assertEqual(lines[1:3], ['Checking idrac0 at 10.0.0.0', 'Done'])
+        self.assertTrue(lines[3].startswith('--- idrac1 FAILED ('))
+        self.assertEqual(lines[4:6], ['Checking idrac1 at 10.0.0.1', 'Failed on idrac1'])
+        self.assertTrue(lines[6].startswith('--- idrac2 OK ('))
+        self.assertEqual(lines[7:9], ['Checking idrac2 at 10.0.0.2', 'Done'])
+        self.assertTrue(lines[9].startswith('Done: 2 succeeded, 1 failed in '))
+
+
+class Namespace(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+from inventory import Inventory
+
+V_DISKS = (['Virtual Disk 0', 'Virtual Disk 1'], ['278.88 GB', '1675.50 GB'], ['Raid-1', 'Raid-5'])
+P_DISKS = (['Physical Disk 0:1:0', 'Physical Disk 0:1:1'], ['558.38 GB', '558.38 GB'])
+SYSINFO = {'Firmware Version': '2.30.30.30', 'System BIOS Version': '2.1.7', 'OS Name': 'VMware ESXi',
+           'RAC Date/Time': 'Thu Jul 21 2016 11:02:47'}
+
+
+class InventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.inventory = Inventory(':memory:')
+
+    def tearDown(self):
+        self.inventory.close()
+
+    def kinds(self, changes):
+        return [(change.kind, change.item, change.old, change.new) for change in changes]
+
+    def test_first_update_has_no_changes(self):
+        self.assertEqual(self.inventory.update_sysinfo('dell1', SYSINFO), [])
+        self.assertEqual(self.inventory.update_disks('dell1', V_DISKS, P_DISKS), [])
+        self.assertEqual(self.inventory.stale(['dell1', 'dell2']), [('dell2', 'sysinfo'), ('dell2', 'disks')])
+        self.assertEqual(len(self.inventory.disks('dell1')), 4)
+
+    def test_firmware_changed(self):
+        self.inventory.update_sysinfo('dell1', SYSINFO)
+        info = dict(SYSINFO, **{'System BIOS Version': '2.4.3', 'RAC Date/Time': 'Fri Jul 22 2016 08:00:00'})
+        self.assertEqual(self.kinds(self.inventory.update_sysinfo('dell1', info)),
+                         [('firmware changed', 'System BIOS Version', '2.1.7', '2.4.3')])
+        self.assertEqual([change.kind for time, change in self.inventory.changes('dell1')], ['firmware changed'])
+
+    def test_partial_sysinfo_keeps_fields(self):
+        # Redfish doesn't report the OS, which must neither be reported as changed nor forgotten
+        self.inventory.update_sysinfo('dell1', SYSINFO)
+        self.assertEqual(self.inventory.update_sysinfo('dell1', {'Firmware Version': '2.30.30.30'}), [])
+        self.assertEqual(self.inventory.sysinfo('dell1')['OS Name'], 'VMware ESXi')
+
+    def test_disk_changes(self):
+        self.inventory.update_disks('dell1', V_DISKS, P_DISKS)
+        v_disks = (['Virtual Disk 0', 'Virtual Disk 1'], ['278.88 GB', '2234.00 GB'], ['Raid-10', 'Raid-5'])
+        p_disks = (['Physical Disk 0:1:0', 'Physical Disk 0:1:2'], ['558.38 GB', '558.38 GB'])
+        self.assertEqual(self.kinds(self.inventory.update_disks('dell1', v_disks, p_disks)), [
+            ('disk removed', 'physical Physical Disk 0:1:1', '558.38 GB', None),
+            ('disk added', 'physical Physical Disk 0:1:2', None, '558.38 GB'),
+            ('raid changed', 'virtual Virtual Disk 0', 'Raid-1', 'Raid-10'),
+            ('disk resized', 'virtual Virtual Disk 1', '1675.50 GB', '2234.00 GB'),
+        ])
+        self.assertEqual(self.inventory.update_disks('dell1', v_disks, p_disks), [])
+
+    def test_hosts_are_separate(self):
+        self.inventory.update_disks('dell1', V_DISKS, P_DISKS)
+        self.assertEqual(self.inventory.update_disks('dell2', ([], [], []), ([], [])), [])
+        self.assertEqual(self.inventory.changes('dell2'), [])
+        self.assertEqual(len(self.inventory.disks('dell1')), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import job_watcher
+from job_watcher import JobWatcher
+
+
+class Clock(object):
+    """
+    Stands in for the time module, sleeping only moves the clock
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class JobWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        job_watcher.time = self.clock
+        self.polls = []
+        self.transitions = []
+
+    def tearDown(self):
+        job_watcher.time = __import__('time')
+
+    def watcher(self, states):
+        """
+        :param states: (message, status) the job reports on each poll, the last one repeats
+        """
+        states = list(states)
+
+        def check(job_id):
+            self.polls.append(self.clock.now)
+            return states.pop(0) if len(states) > 1 else states[0]
+        return JobWatcher(check, lambda job_id, message, status: self.transitions.append(status))
+
+    def delays(self):
+        return [b - a for a, b in zip(self.polls, self.polls[1:])]
+
+    def test_backoff(self):
+        watcher = self.watcher([('Downloading package.', 'Downloading')] * 5 + [('Done.', 'Completed')])
+        self.assertEqual(watcher.wait('JID_1'), ('Done.', 'Completed'))
+        self.assertEqual(self.delays(), [5, 10, 20, 30, 30])
+        self.assertEqual(self.transitions, ['Downloading', 'Completed'])
+
+    def test_reset_on_transition(self):
+        watcher = self.watcher([('Downloading package.', 'Downloading')] * 3 + [('Scheduled.', 'Scheduled')] * 3 +
+                               [('Done.', 'Completed')])
+        watcher.wait('JID_1')
+        # Downloading backs off 5, 10; Scheduled starts over at 10, 20, then 40
+        self.assertEqual(self.delays(), [5, 10, 20, 10, 20, 40])
+        self.assertEqual(self.transitions, ['Downloading', 'Scheduled', 'Completed'])
+
+    def test_message_change_resets(self):
+        watcher = self.watcher([('15%', 'Running'), ('15%', 'Running'), ('60%', 'Running'), ('Done.', 'Completed')])
+        watcher.wait('JID_1')
+        self.assertEqual(self.delays(), [15, 30, 15])
+
+    def test_until_and_timeout(self):
+        watcher = self.watcher([('Scheduled.', 'Scheduled')])
+        self.assertEqual(watcher.wait('JID_1', until=lambda message, status: status == 'Scheduled'),
+                         ('Scheduled.', 'Scheduled'))
+        self.assertEqual(len(self.polls), 1)
+        start = self.clock.now
+        watcher = self.watcher([('Running.', 'Running')])
+        self.assertEqual(watcher.wait('JID_2', timeout=100), ('Running.', 'Running'))
+        self.assertEqual(self.clock.now - start, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
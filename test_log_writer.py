@@ -0,0 +1,87 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from log_writer import LogWriter, MASK
+
+
+class LogWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp, 'Dell.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def writer(self, **options):
+        return LogWriter(self.path, flush_interval=0.01, **options)
+
+    def records(self, path=None):
+        with open(path or self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_redact(self):
+        writer = self.writer()
+        writer.add_secret('s3cret!')
+        self.assertEqual(writer.redact(u'Login with s3cret! failed'), u'Login with ' + MASK + ' failed')
+        self.assertEqual(writer.redact('racadm update -f bios.EXE -u root -p calvin -l //share'),
+                         'racadm update -f bios.EXE -u root -p ' + MASK + ' -l //share')
+        self.assertEqual(writer.redact('Dell.Password=calvin'), 'Dell.Password=' + MASK)
+        self.assertEqual(writer.redact('Changing password to: n3w'), 'Changing password to: ' + MASK)
+        writer.write({'message': 'sent s3cret!', 'level': 20})
+        writer.flush()
+        self.assertEqual(self.records(), [{'message': 'sent ' + MASK, 'level': 20}])
+
+    def test_secrets_bounded(self):
+        writer = self.writer(max_secrets=2)
+        for secret in 'alpha', 'bravo', 'alpha', 'charlie':
+            writer.add_secret(secret)
+        # bravo was registered least recently
+        self.assertEqual(writer.redact('alpha bravo charlie'), MASK + ' bravo ' + MASK)
+
+    def test_add_secret_while_redacting(self):
+        writer = self.writer(max_secrets=50)
+        errors = []
+
+        def add():
+            for x in xrange(5000):
+                writer.add_secret('secret%d' % x)
+
+        def redact():
+            try:
+                for x in xrange(500):
+                    writer.redact('nothing to hide')
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=add), threading.Thread(target=redact)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(writer._secrets), 50)
+
+    def test_rotation(self):
+        writer = self.writer(max_bytes=100, backups=2)
+        for x in xrange(5):
+            writer.write({'message': 'x' * 60, 'index': x})
+            writer.flush()
+        self.assertEqual(sorted(os.listdir(self.temp)), ['Dell.log', 'Dell.log.1', 'Dell.log.2'])
+        self.assertEqual([record['index'] for record in self.records()], [4])
+        self.assertEqual([record['index'] for record in self.records(self.path + '.1')], [3])
+        self.assertEqual([record['index'] for record in self.records(self.path + '.2')], [2])
+
+    def test_not_utf8(self):
+        writer = self.writer()
+        writer.write({'message': 'reply: \xff\xfe ok'})
+        writer.write({'message': 'next'})
+        writer.flush()
+        self.assertEqual(self.records(), [{'message': u'reply: \ufffd\ufffd ok'}, {'message': 'next'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
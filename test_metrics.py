@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from metrics import Metrics
+try:
+    import driver
+except ImportError:  # the CloudShell packages are only installed where the driver is deployed
+    driver = None
+
+NAME = 'dell_idrac_operation_seconds'
+LABELS = 'operation="racadm",host="idrac1"'
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1, 10))
+
+    def lines(self):
+        return self.metrics.export().splitlines()
+
+    def test_buckets(self):
+        for seconds in 0.05, 0.1, 0.5, 20:
+            self.metrics.observe('racadm', 'idrac1', seconds)
+        lines = self.lines()
+        self.assertEqual(lines[:2], ['# HELP ' + NAME + ' Latency of driver operations.', '# TYPE ' + NAME + ' histogram'])
+        self.assertEqual(lines[2:8], [NAME + '_bucket{' + LABELS + ',le="0.1"} 2',
+                                      NAME + '_bucket{' + LABELS + ',le="1.0"} 3',
+                                      NAME + '_bucket{' + LABELS + ',le="10.0"} 3',
+                                      NAME + '_bucket{' + LABELS + ',le="+Inf"} 4',
+                                      NAME + '_sum{' + LABELS + '} ' + repr(0.05 + 0.1 + 0.5 + 20),
+                                      NAME + '_count{' + LABELS + '} 4'])
+
+    def test_errors(self):
+        self.metrics.observe('racadm', 'idrac1', 0.5)
+        try:
+            with self.metrics.span('racadm', 'idrac1'):
+                raise ValueError('boom')
+        except ValueError:
+            pass
+        self.metrics.observe('ssh', 'idrac2', 0.5)
+        lines = self.lines()
+        self.assertIn('# TYPE dell_idrac_operation_errors_total counter', lines)
+        self.assertIn('dell_idrac_operation_errors_total{' + LABELS + '} 1', lines)
+        self.assertIn('dell_idrac_operation_errors_total{operation="ssh",host="idrac2"} 0', lines)
+        self.assertIn(NAME + '_count{' + LABELS + '} 2', lines)
+
+    def test_labels_escaped(self):
+        self.metrics.observe('say "hi"\n', 'c:\\idrac', 1)
+        self.assertIn(NAME + '_count{operation="say \\"hi\\"\\n",host="c:\\\\idrac"} 1', self.lines())
+
+    def test_empty(self):
+        self.assertEqual(self.lines(), ['# HELP ' + NAME + ' Latency of driver operations.', '# TYPE ' + NAME + ' histogram'])
+
+    def test_nested_spans(self):
+        trace = self.metrics.start_trace()
+        self.assertIsNone(self.metrics.start_trace())
+        with self.metrics.span('command'):
+            with self.metrics.span('racadm'):
+                pass
+        self.metrics.end_trace()
+        self.assertEqual(sorted(trace.stacks), ['command', 'command;racadm'])
+
+    def test_write(self):
+        temp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp, 'Dell.prom')
+            self.metrics.observe('racadm', 'idrac1', 0.5)
+            self.metrics.write(path)
+            self.metrics.write(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), self.metrics.export())
+            self.assertEqual(os.listdir(temp), ['Dell.prom'])
+        finally:
+            shutil.rmtree(temp)
+
+
+@unittest.skipIf(driver is None, "the driver needs the CloudShell packages")
+class ExportTest(unittest.TestCase):
+    """
+    Only the outermost command writes the metrics file, not every fleet member's
+    """
+
+    def setUp(self):
+        self.written = []
+        self.write = driver.timings.write
+        driver.timings.write = self.written.append
+
+    def tearDown(self):
+        driver.timings.write = self.write
+
+    def test_member_skips_export(self):
+        outer = driver.DellLifecycleDriver()
+        member = driver.DellLifecycleDriver()
+        member._captured = []
+
+        @driver.driver_command
+        def command(self, context):
+            return 'done'
+        self.assertEqual(command(member, None), 'done')
+        self.assertEqual(self.written, [])
+        command(outer, None)
+        self.assertEqual(self.written, [driver.METRICS_PATH])
@@ -0,0 +1,98 @@
+import time
+import threading
+import unittest
+
+from output_sink import OutputSink
+
+
+class Output(object):
+    """
+    Stands in for WriteMessageToReservationOutput, failing the next calls while failures is above zero
+    """
+
+    def __init__(self):
+        self.messages = []
+        self.failures = 0
+        self.written = threading.Event()
+
+    def write(self, message):
+        if self.failures:
+            self.failures -= 1
+            raise Exception('API unavailable')
+        self.messages.append(message)
+        self.written.set()
+
+
+class OutputSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output = Output()
+
+    def tearDown(self):
+        # Cancelled timers still have to wake up to end their threads
+        for thread in threading.enumerate():
+            if isinstance(thread, threading._Timer):
+                thread.join(1)
+
+    def test_order(self):
+        sink = OutputSink(self.output.write, max_lines=100, max_age=60)
+        for x in xrange(5):
+            sink.add('line %d' % x)
+        self.assertEqual(self.output.messages, [])
+        sink.flush()
+        sink.flush()
+        self.assertEqual(self.output.messages, ['line 0\nline 1\nline 2\nline 3\nline 4'])
+
+    def test_max_lines(self):
+        sink = OutputSink(self.output.write, max_lines=3, max_age=60)
+        for x in xrange(7):
+            sink.add(str(x))
+        self.assertEqual(self.output.messages, ['0\n1\n2', '3\n4\n5'])
+        sink.flush()
+        self.assertEqual(self.output.messages[-1], '6')
+
+    def test_max_age(self):
+        sink = OutputSink(self.output.write, max_lines=100, max_age=0.05)
+        start = time.time()
+        sink.add('first')
+        sink.add('second')
+        self.assertTrue(self.output.written.wait(5))
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        self.assertEqual(self.output.messages, ['first\nsecond'])
+        # The next message starts a new timer
+        self.output.written.clear()
+        sink.add('third')
+        self.assertTrue(self.output.written.wait(5))
+        self.assertEqual(self.output.messages, ['first\nsecond', 'third'])
+
+    def test_requeue_after_failed_write(self):
+        sink = OutputSink(self.output.write, max_lines=100, max_age=60)
+        sink.add('first')
+        sink.add('second')
+        self.output.failures = 1
+        self.assertRaises(Exception, sink.flush)
+        sink.add('third')
+        sink.flush()
+        self.assertEqual(self.output.messages, ['first\nsecond\nthird'])
+
+    def test_requeue_after_failed_max_lines_flush(self):
+        sink = OutputSink(self.output.write, max_lines=2, max_age=60)
+        sink.add('first')
+        self.output.failures = 1
+        self.assertRaises(Exception, sink.add, 'second')
+        sink.add('third')
+        self.assertEqual(self.output.messages, ['first\nsecond\nthird'])
+
+    def test_requeue_after_failed_timed_flush(self):
+        sink = OutputSink(self.output.write, max_lines=100, max_age=0.02)
+        self.output.failures = 1
+        sink.add('first')
+        time.sleep(0.2)
+        self.assertEqual(self.output.messages, [])
+        sink.add('second')
+        sink.flush()
+        self.assertEqual(self.output.messages, ['first\nsecond'])
+
+
+if __name__ == '__main__':
+    unittest.main()
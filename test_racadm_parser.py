@@ -0,0 +1,130 @@
+import os
+import unittest
+
+from racadm_parser import parse_vdisks, parse_pdisks, parse_jobs, parse_sysinfo, job_status, find_job, \
+    vdisk_parser, pdisk_parser, job_parser, sysinfo_parser, split_pipelined
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'fixtures')
+PROMPT = '/admin1->'
+ERROR = 'ERROR: Invalid subcommand specified.'
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as f:
+        return f.read()
+
+
+def body(name):
+    """
+    A fixture reply without its echoed command line and trailing prompt
+    """
+    return fixture(name).split('\r\n', 1)[1].rsplit('\r\n', 1)[0]
+
+
+def feed_bytes(parser, text):
+    """
+    Feed the reply one byte at a time, like the worst case of chunks arriving from the channel
+    """
+    records = []
+    for x in xrange(len(text)):
+        records += parser.feed(text[x])
+    return records + parser.close()
+
+
+class ParserTest(unittest.TestCase):
+
+    def test_vdisks(self):
+        disks = parse_vdisks(fixture('vdisks.txt'))
+        self.assertEqual([(disk.name, disk.size, disk.layout) for disk in disks],
+                         [('Virtual Disk 0', '278.88 GB', 'Raid-1'), ('Virtual Disk 1', '1675.50 GB', 'Raid-5')])
+        self.assertEqual(disks[0].fqdd, 'Disk.Virtual.0:RAID.Integrated.1-1')
+
+    def test_pdisks(self):
+        disks = parse_pdisks(fixture('pdisks.txt'))
+        self.assertEqual(len(disks), 8)
+        self.assertEqual(disks[7].name, 'Physical Disk 0:1:7')
+        self.assertEqual(set(disk.size for disk in disks), set(['558.38 GB']))
+        self.assertEqual(disks[0].media_type, 'HDD')
+
+    def test_jobs(self):
+        jobs = parse_jobs(fixture('jobqueue.txt'))
+        self.assertEqual([job.job_id for job in jobs], ['JID_467392843911', 'JID_468855180562', 'JID_469210554734'])
+        self.assertEqual(jobs[2].status, 'Downloading')
+        self.assertEqual(jobs[2].percent, '15')
+        self.assertEqual(find_job(fixture('jobqueue.txt'), 'Downloading', 'Firmware Update'),
+                         ('JID_469210554734', '[RED003: Downloading package.]'))
+        self.assertEqual(job_status(parse_jobs(fixture('jobqueue_single.txt')), 'JID_469210554734'),
+                         ('[JCP001: Task successfully scheduled.]', 'Scheduled'))
+        self.assertEqual(job_status(jobs, 'JID_000000000000')[1], 'Error')
+
+    def test_sysinfo(self):
+        info = parse_sysinfo(fixture('getsysinfo.txt'))
+        self.assertEqual(info['Firmware Version'], '2.30.30.30')
+        self.assertEqual(info['System BIOS Version'], '2.1.7')
+        self.assertEqual(info['OS Name'], 'VMware ESXi 6.0.0 build-3620759')
+
+    def test_byte_chunks(self):
+        for name, parser, parse in (('vdisks.txt', vdisk_parser, parse_vdisks), ('pdisks.txt', pdisk_parser, parse_pdisks),
+                                    ('jobqueue.txt', job_parser, parse_jobs)):
+            self.assertEqual(feed_bytes(parser(), fixture(name)), parse(fixture(name)), name)
+        self.assertEqual(feed_bytes(sysinfo_parser(), fixture('getsysinfo.txt')), [parse_sysinfo(fixture('getsysinfo.txt'))])
+
+    def test_lf_only(self):
+        for name, parse in (('vdisks.txt', parse_vdisks), ('pdisks.txt', parse_pdisks), ('jobqueue.txt', parse_jobs),
+                            ('getsysinfo.txt', parse_sysinfo)):
+            self.assertEqual(parse(fixture(name).replace('\r\n', '\n')), parse(fixture(name)), name)
+
+    def test_error_replies(self):
+        reply = 'racadm raid get pdisks -o\r\nERROR: STOR0103 : No physical disks are displayed.\r\n' \
+                '   Check if the server has power, physical disks are available, and physical disks are connected to ' \
+                'the enclosure or backplane.\r\n' + PROMPT + ' '
+        self.assertEqual(parse_pdisks(reply), [])
+        self.assertEqual(parse_vdisks(reply.replace('pdisks', 'vdisks')), [])
+        self.assertEqual(parse_sysinfo('getsysinfo\r\nERROR: Unable to perform the requested operation.\r\n'), {})
+        self.assertEqual(find_job('racadm jobqueue view\r\nERROR: RAC1171: Unable to complete the operation.\r\n'),
+                         ('', ''))
+
+
+class SplitPipelinedTest(unittest.TestCase):
+    commands = ['racadm raid get vdisks -o', 'racadm raid get pdisks -o']
+    markers = ['__mark_0__', '__mark_1__']
+    replies = [body('vdisks.txt'), body('pdisks.txt')]
+
+    def check(self, text):
+        v_out, p_out = split_pipelined(text, PROMPT, self.commands, self.markers)
+        self.assertEqual(len(parse_vdisks(v_out)), len(parse_vdisks(fixture('vdisks.txt'))))
+        self.assertEqual(len(parse_pdisks(p_out)), len(parse_pdisks(fixture('pdisks.txt'))))
+        self.assertFalse(parse_pdisks(v_out))
+        self.assertFalse(parse_vdisks(p_out))
+        for out in v_out, p_out:
+            self.assertNotIn('__mark_', out)
+            self.assertTrue(out.endswith(PROMPT))
+
+    def test_echo_inline(self):
+        text = ''
+        for command, marker, reply in zip(self.commands, self.markers, self.replies):
+            text += ' ' + command + '\r\n' + reply + '\r\n' + PROMPT
+            text += ' ' + marker + '\r\n' + ERROR + '\r\n' + PROMPT
+        self.check(text + ' ')
+
+    def test_echo_upfront(self):
+        text = ''
+        for command, marker in zip(self.commands, self.markers):
+            text += command + '\r\n' + marker + '\r\n'
+        for reply in self.replies:
+            text += reply + '\r\n' + PROMPT + ' ' + ERROR + '\r\n' + PROMPT + ' '
+        self.check(text)
+
+    def test_missing_prompts(self):
+        text = ' ' + self.commands[0] + '\r\n' + self.replies[0] + '\r\n' + PROMPT
+        self.assertIsNone(split_pipelined(text, PROMPT, self.commands, self.markers))
+
+    def test_missing_markers(self):
+        text = ''
+        for reply in self.replies:
+            text += reply + '\r\n' + PROMPT + ' ' + ERROR + '\r\n' + PROMPT + ' '
+        self.assertIsNone(split_pipelined(text, PROMPT, self.commands, self.markers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,304 @@
+import os
+import sys
+import time
+import select
+import socket
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from fake_idrac import FakeIDRACServer, USER, PASSWORD, loopback_addresses
+from job_watcher import JobWatcher
+from reactor import Reactor, Return, Sleep, InThread, Timeout, read_until, reconnect
+try:
+    import driver
+except ImportError:  # the CloudShell packages are only installed where the driver is deployed
+    driver = None
+
+
+class Channel(object):
+    """
+    Stands in for a paramiko channel: select()able, and fed through the other end of a socket pair
+    """
+
+    def __init__(self):
+        self.sock, self.peer = socket.socketpair()
+        self.closed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def recv_ready(self):
+        return bool(select.select([self.sock], [], [], 0)[0])
+
+    def recv(self, size):
+        return self.sock.recv(size)
+
+    def exit_status_ready(self):
+        return False
+
+    def close(self):
+        self.sock.close()
+        self.peer.close()
+
+
+class FastWatcher(JobWatcher):
+    BACKOFF = {}
+    DEFAULT_BACKOFF = (0.01, 0.05)
+
+
+class ReactorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = Reactor(max_threads=2)
+
+    def tearDown(self):
+        self.reactor.close()
+
+    def test_nested_returns(self):
+        def double(x):
+            yield Sleep(0.01)
+            raise Return(x * 2)
+
+        def add(x):
+            a = yield double(x)
+            b = yield double(a)
+            raise Return(a + b)
+        self.assertEqual(self.reactor.run_until_complete(add(1)), 6)
+
+    def test_sleeps_interleave(self):
+        order = []
+
+        def sleeper(name, seconds):
+            yield Sleep(seconds)
+            order.append(name)
+        for name, seconds in (('slow', 0.06), ('fast', 0.01), ('middle', 0.03)):
+            self.reactor.spawn(sleeper(name, seconds))
+        start = time.time()
+        self.reactor.run()
+        self.assertEqual(order, ['fast', 'middle', 'slow'])
+        self.assertLess(time.time() - start, 0.2)
+
+    def test_in_thread(self):
+        def fail():
+            raise ValueError('boom')
+
+        def call():
+            value = yield InThread(lambda x: x + 1, 1)
+            try:
+                yield InThread(fail)
+            except ValueError, e:
+                raise Return((value, str(e)))
+        self.assertEqual(self.reactor.run_until_complete(call()), (2, 'boom'))
+
+    def test_max_threads(self):
+        running = [0, 0]
+        lock = threading.Lock()
+
+        def block():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+        def call():
+            yield InThread(block)
+        tasks = [self.reactor.spawn(call()) for x in xrange(6)]
+        self.reactor.run()
+        self.assertTrue(all(task.done and task.error is None for task in tasks))
+        self.assertEqual(running[1], 2)
+
+    def test_timeout(self):
+        cleaned = []
+
+        def stuck():
+            try:
+                yield Sleep(10)
+            finally:
+                cleaned.append(True)
+
+        def quick():
+            yield Sleep(0.01)
+            raise Return('done')
+        stuck_task = self.reactor.spawn(stuck(), timeout=0.05)
+        # Its deadline is still in the timers when it finishes, which must not keep the loop running
+        quick_task = self.reactor.spawn(quick(), timeout=10)
+        start = time.time()
+        self.reactor.run()
+        self.assertLess(time.time() - start, 1)
+        self.assertIs(stuck_task.error[0], Timeout)
+        self.assertEqual(cleaned, [True])
+        self.assertEqual(quick_task.result, 'done')
+
+    def test_reconnect(self):
+        attempts = []
+
+        def connect():
+            yield Sleep(0)
+            attempts.append(True)
+            if len(attempts) < 3:
+                raise Exception('refused')
+            raise Return('connected')
+        errors = []
+        result = self.reactor.run_until_complete(
+            reconnect(connect, retries=5, delay=0.01, on_error=lambda x, e: errors.append((x, str(e)))))
+        self.assertEqual(result, 'connected')
+        self.assertEqual(errors, [(0, 'refused'), (1, 'refused')])
+
+        def refused():
+            yield Sleep(0)
+            raise Exception('refused')
+        self.assertRaises(Exception, self.reactor.run_until_complete, reconnect(refused, retries=2, delay=0))
+
+
+class ReadUntilTest(unittest.TestCase):
+
+    def setUp(self):
+        self.reactor = Reactor()
+        self.chan = Channel()
+
+    def tearDown(self):
+        self.reactor.close()
+        self.chan.close()
+
+    def feed(self, *chunks):
+        for chunk in chunks:
+            yield Sleep(0.01)
+            self.chan.peer.send(chunk)
+
+    def test_prompt_split_across_chunks(self):
+        self.reactor.spawn(self.feed('Server power status: ON\r\n/adm', 'in1-> '))
+        task = self.reactor.spawn(read_until(self.chan, '>', 5))
+        self.reactor.run()
+        self.assertEqual(task.result.getvalue(), 'Server power status: ON\r\n/admin1-> ')
+
+    def test_readers_share_the_loop(self):
+        other = Channel()
+        try:
+            def feed():
+                yield Sleep(0.01)
+                other.peer.send('second\r\n>')
+                yield Sleep(0.01)
+                self.chan.peer.send('first\r\n>')
+            self.reactor.spawn(feed())
+            first = self.reactor.spawn(read_until(self.chan, '>', 5))
+            second = self.reactor.spawn(read_until(other, '>', 5))
+            self.reactor.run()
+            self.assertEqual((first.result.getvalue(), second.result.getvalue()), ('first\r\n>', 'second\r\n>'))
+        finally:
+            other.close()
+
+    def test_timeout(self):
+        self.reactor.spawn(self.feed('no prompt yet'))
+        self.assertRaises(Exception, self.reactor.run_until_complete, read_until(self.chan, '>', 0.1))
+
+    def test_watch_jobs(self):
+        states = {'JID_1': [('Downloading', 'Downloading'), ('Scheduled', 'Scheduled')],
+                  'JID_2': [('Running', 'Running'), ('Running', 'Running'), ('Done', 'Completed')]}
+
+        def check(job_id):
+            yield Sleep(0)
+            raise Return(states[job_id].pop(0) if len(states[job_id]) > 1 else states[job_id][0])
+        watcher = FastWatcher(check)
+        result = self.reactor.run_until_complete(
+            watcher.watch(['JID_1', 'JID_2'], until=lambda message, status: 'Scheduled' in status, timeout=5))
+        self.assertEqual(result, {'JID_1': ('Scheduled', 'Scheduled'), 'JID_2': ('Done', 'Completed')})
+
+
+@unittest.skipIf(driver is None, "the driver needs the CloudShell packages")
+class RunOnFleetTest(unittest.TestCase):
+    """
+    run_on_fleet drives every server's channel from one loop
+    """
+    HOSTS = 3
+
+    @classmethod
+    def setUpClass(cls):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        cls.port = sock.getsockname()[1]
+        sock.close()
+        cls.addresses = loopback_addresses('127.0.1.1', cls.HOSTS)
+        cls.server = FakeIDRACServer(cls.HOSTS, cls.addresses[0], cls.port, latency=0.05).start()
+        cls.cwd = os.getcwd()
+        cls.temp = tempfile.mkdtemp()
+        os.chdir(cls.temp)  # the driver's log goes to a relative path off Windows
+
+    @classmethod
+    def tearDownClass(cls):
+        driver.get_writer(driver.LOG_PATH).flush()
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.temp)
+        cls.server.stop()
+
+    def run_on_fleet(self, operation, argument='', **attributes):
+        test = self
+
+        class Session(object):
+            def GetResourceDetails(self, name):
+                attrs = dict({'User': USER, 'Password': 'encrypted', 'SSH Port': str(test.port)}, **attributes)
+                return Namespace(Address=test.addresses[int(name[-1])],
+                                 ResourceAttributes=[Namespace(Name='Dell.' + key, Value=value)
+                                                     for key, value in attrs.items()])
+        dell = driver.DellLifecycleDriver()
+        dell._decrypt = lambda encrypted: PASSWORD
+        dell._cs_session = lambda context: None
+        dell.name, dell.address, dell.session = 'fleet', self.addresses[0], Session()
+        dell._load_attributes(dict({'User': USER, 'Password': 'encrypted'}, **attributes))
+        dell._captured = []
+        names = ','.join('idrac%d' % x for x in xrange(self.HOSTS))
+        dell.run_on_fleet(Namespace(reservation=Namespace(reservation_id='test')), names, operation, argument)
+        for address in self.addresses:
+            self.assertEqual(driver.ssh_pool._in_use.get((address, self.port, USER), 0), 0)
+        return dell._captured[-1]
+
+    def test_os(self):
+        report = self.run_on_fleet('os', **{'Sysinfo Cache TTL': '0.001'})
+        for x in xrange(self.HOSTS):
+            self.assertIn('--- idrac%d OK' % x, report)
+        self.assertIn('OS Version: for: idrac2 Is: VMware ESXi 6.0.0 build-3620759', report)
+        self.assertTrue(report.endswith('3 succeeded, 0 failed in ' + report.rsplit(' ', 1)[-1]))
+
+    def test_jobs(self):
+        job_ids = []
+        for address in self.addresses:
+            host = self.server.hosts[address]
+            host.answer('racadm update -f bios.EXE -u user -p password -l //share')
+            job_ids.append(host.jobs[-1]['id'])
+        # Without a job id every job not finished yet is watched, leave out the recorded download that never ends
+        replies = self.server.hosts[self.addresses[0]].replies
+        recorded = replies['jobs']
+        replies['jobs'] = [block for block in recorded if 'Status=Downloading' not in block]
+        backoff = JobWatcher.BACKOFF
+        JobWatcher.BACKOFF = {'Downloading': (0.05, 0.1)}
+        try:
+            report = self.run_on_fleet('jobs')
+        finally:
+            JobWatcher.BACKOFF = backoff
+            replies['jobs'] = recorded
+        for job_id in job_ids:
+            self.assertIn(job_id + ': Scheduled [JCP001: Task successfully scheduled.]', report)
+        self.assertIn('Done: 3 succeeded', report)
+
+    def test_host_timeout(self):
+        self.server.latency = 1
+        try:
+            report = self.run_on_fleet('power', 'status', **{'Fleet Host Timeout': '0.5'})
+        finally:
+            self.server.latency = 0.05
+        self.assertIn('--- idrac0 FAILED', report)
+        self.assertIn('Timed out after 0.5 seconds', report)
+        self.assertIn('0 succeeded, 3 failed', report)
+
+
+class Namespace(object):
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import re
+import unittest
+
+from receive_buffer import ReceiveBuffer
+
+PROMPT = re.compile(r'/admin1->\s*$')
+
+
+class ReceiveBufferTest(unittest.TestCase):
+
+    def test_spill(self):
+        buff = ReceiveBuffer(overlap=16, max_size=64)
+        data = ''.join('line %04d\r\n' % x for x in xrange(100))
+        for x in xrange(0, len(data), 7):
+            buff.append(data[x:x + 7])
+        try:
+            self.assertEqual(len(buff), len(data))
+            self.assertEqual(buff.getvalue(), data)
+            self.assertEqual(buff.tail(11), 'line 0099\r\n')
+            # More than the overlap kept in memory, so part of it comes from the spill file
+            self.assertEqual(buff.tail(200), data[-200:])
+            self.assertEqual(buff.tail(len(data) + 10), data)
+            self.assertTrue(len(buff._data) <= 64)
+        finally:
+            buff.close()
+
+    def test_search_overlap(self):
+        # The prompt arrives split across chunks, so the match has to start in data already searched
+        buff = ReceiveBuffer(overlap=16)
+        buff.append('Server power status: ON\r\n/adm')
+        self.assertIsNone(buff.search(PROMPT))
+        buff.append('in1-> ')
+        self.assertIsNotNone(buff.search(PROMPT))
+
+    def test_search_tail_only(self):
+        buff = ReceiveBuffer(overlap=4)
+        buff.append('/admin1-> ')
+        self.assertIsNotNone(buff.search(PROMPT))
+        buff.append('x' * 32)
+        self.assertIsNone(buff.search(re.compile('admin1')))
+
+    def test_search_after_spill(self):
+        buff = ReceiveBuffer(overlap=16, max_size=32)
+        try:
+            buff.append('x' * 100 + '/admin')
+            self.assertIsNone(buff.search(PROMPT))
+            buff.append('1-> ')
+            self.assertIsNotNone(buff.search(PROMPT))
+            self.assertEqual(buff.getvalue(), 'x' * 100 + '/admin1-> ')
+        finally:
+            buff.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+from fake_redfish import FakeRedfishServer, SYSTEM, STORAGE, USER, PASSWORD
+from redfish import RedfishClient, RedfishError
+
+
+class RedfishClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeRedfishServer().start()
+        self.client = RedfishClient('127.0.0.1', USER, PASSWORD, url=self.server.url, timeout=5)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_sysinfo(self):
+        info = self.client.get_sysinfo()
+        self.assertEqual(info['System BIOS Version'], '2.4.3')
+        self.assertEqual(info['Firmware Version'], '2.30.30.30')
+        self.assertEqual(info['Host Name'], 'esx01')
+
+    def test_power(self):
+        self.assertEqual(self.client.power('status'), 'Server power status: ON')
+        self.assertEqual(self.client.power('stop'), 'Server power operation successful')
+        self.assertEqual(self.client.power('status'), 'Server power status: OFF')
+        self.assertIn(('POST', SYSTEM + '/Actions/ComputerSystem.Reset', {'ResetType': 'ForceOff'}), self.server.requests)
+
+    def test_disks(self):
+        (v_names, v_sizes, v_raids), (p_names, p_sizes) = self.client.get_disks()
+        self.assertEqual(v_names, ['Virtual Disk 0'])
+        self.assertEqual(v_sizes, ['558.38 GB'])
+        self.assertEqual(v_raids, ['RAID1'])
+        self.assertEqual(p_names, ['Physical Disk 0:1:0', 'Physical Disk 0:1:1'])
+
+    def test_job_status(self):
+        self.assertEqual(self.client.job_status('JID_469210554734'), ('Task successfully scheduled.', 'Scheduled'))
+        self.assertRaises(RedfishError, self.client.job_status, 'JID_000000000000')
+
+    def test_set_password(self):
+        self.assertTrue(self.client.set_password('new-password'))
+        self.assertEqual(self.server.password, 'new-password')
+
+    def test_wrong_password(self):
+        client = RedfishClient('127.0.0.1', USER, 'wrong', url=self.server.url, timeout=5)
+        self.assertRaises(RedfishError, client.get_sysinfo)
+
+    def test_invalid_json(self):
+        self.server.resources[SYSTEM] = '{"BiosVersion": '
+        self.assertRaises(RedfishError, self.client.get_sysinfo)
+
+    def test_unexpected_shapes(self):
+        self.server.resources[SYSTEM] = ['not', 'an', 'object']
+        self.assertRaises(RedfishError, self.client.get_sysinfo)
+        self.server.resources[SYSTEM] = {'PowerState': 5}
+        self.assertRaises(RedfishError, self.client.power, 'status')
+        self.server.resources[SYSTEM + '/Storage'] = {'Members': [{'Id': 'RAID.Integrated.1-1'}]}
+        self.assertRaises(RedfishError, self.client.get_disks)
+        self.server.resources[SYSTEM + '/Storage'] = {'Members': [{'@odata.id': STORAGE}]}
+        self.server.resources[STORAGE]['Drives'] = 'Disk.Bay.0'
+        self.assertRaises(RedfishError, self.client.get_disks)
+
+
+if __name__ == '__main__':
+    unittest.main()
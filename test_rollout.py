@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import rollout
+from rollout import FirmwareRollout, RolloutState, TokenBucket, UPDATED, SKIPPED, FAILED, PENDING
+
+TARGET = '2.4.3'
+
+
+class Clock(object):
+    """
+    Stands in for the time module, sleeping only moves the clock
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def strftime(self, format):
+        return 'now'
+
+
+class Servers(object):
+    """
+    Fake hosts: update() moves a host to the target version, or raises for the broken ones
+    """
+
+    def __init__(self, versions, broken=()):
+        self.versions = dict(versions)
+        self.broken = set(broken)
+        self.updated = []
+
+    def current_version(self, host):
+        return self.versions[host]
+
+    def update(self, host):
+        self.updated.append(host)
+        if host in self.broken:
+            raise Exception('update failed on ' + host)
+        self.versions[host] = TARGET
+        return 'updated'
+
+
+class RolloutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        rollout.time = self.clock
+        self.temp = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp, 'rollout.json')
+
+    def tearDown(self):
+        rollout.time = __import__('time')
+        shutil.rmtree(self.temp)
+
+    def rollout(self, servers, state=None, **options):
+        hosts = sorted(servers.versions)
+        return FirmwareRollout(hosts, servers.current_version, servers.update, TARGET, state or RolloutState(self.path),
+                               max_parallel=2, **options)
+
+    def test_canary_abort(self):
+        servers = Servers(dict(('idrac%d' % x, '2.1.7') for x in xrange(5)), broken=['idrac0'])
+        plan = self.rollout(servers, canary_count=1, wave_size=2)
+        self.assertEqual(plan.run(), (False, "Canary wave failed"))
+        self.assertEqual(servers.updated, ['idrac0'])
+        self.assertEqual(plan.state.status('idrac0'), FAILED)
+        self.assertIn('update failed on idrac0', plan.state.hosts['idrac0']['detail'])
+        self.assertEqual([plan.state.status('idrac%d' % x) for x in xrange(1, 5)], [PENDING] * 4)
+
+    def test_failure_ratio_per_wave(self):
+        # One failure in five is within max_failure_ratio=0.2, two are not
+        servers = Servers(dict(('idrac%02d' % x, '2.1.7') for x in xrange(15)),
+                          broken=['idrac00', 'idrac05', 'idrac06'])
+        waves = []
+        plan = self.rollout(servers, canary_count=0, wave_size=5, max_failure_ratio=0.2)
+        completed, reason = plan.run(on_wave=lambda number, wave, results: waves.append(
+            (number, [result.ok for result in results])))
+        self.assertFalse(completed)
+        self.assertEqual(reason, "Wave 1 failed on 2 of 5 hosts")
+        self.assertEqual(waves, [(0, [False, True, True, True, True]), (1, [False, False, True, True, True])])
+        self.assertEqual(sorted(servers.updated), ['idrac%02d' % x for x in xrange(10)])
+        self.assertEqual([plan.state.status('idrac%02d' % x) for x in xrange(10, 15)], [PENDING] * 5)
+
+    def test_resume(self):
+        state = RolloutState(self.path)
+        state.set('idrac0', UPDATED, 'now at ' + TARGET)
+        state.set('idrac1', SKIPPED, 'already at ' + TARGET)
+        state.set('idrac2', FAILED, 'update failed on idrac2')
+        servers = Servers({'idrac0': '2.1.7', 'idrac1': '2.1.7', 'idrac2': '2.1.7', 'idrac3': '2.1.7'})
+        plan = self.rollout(servers, state=RolloutState(self.path), canary_count=1, wave_size=5)
+        self.assertEqual(plan.waves(), [['idrac2'], ['idrac3']])
+        self.assertEqual(plan.run(), (True, ''))
+        self.assertEqual(servers.updated, ['idrac2', 'idrac3'])
+        saved = RolloutState(self.path)
+        self.assertEqual([saved.status('idrac%d' % x) for x in xrange(4)], [UPDATED, SKIPPED, UPDATED, UPDATED])
+
+    def test_skip_at_target(self):
+        servers = Servers({'idrac0': '2.1.7', 'idrac1': TARGET, 'idrac2': '2.10.0'})
+        plan = self.rollout(servers, canary_count=0, wave_size=5)
+        self.assertEqual(plan.run(), (True, ''))
+        self.assertEqual(servers.updated, ['idrac0'])
+        self.assertEqual(plan.state.hosts['idrac2'], {'status': SKIPPED, 'detail': 'already at 2.10.0', 'time': 'now'})
+        self.assertTrue(plan.report().endswith('Rollout to ' + TARGET + ': 2 skipped, 1 updated'))
+
+    def test_still_old_after_update(self):
+        servers = Servers({'idrac0': '2.1.7'})
+        servers.update = lambda host: None
+        plan = self.rollout(servers, canary_count=0)
+        self.assertEqual(plan.run(), (False, "Wave 0 failed on 1 of 1 hosts"))
+        self.assertEqual(plan.state.hosts['idrac0']['detail'], 'still at 2.1.7 after the update')
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        rollout.time = self.clock
+
+    def tearDown(self):
+        rollout.time = __import__('time')
+
+    def test_wait(self):
+        bucket = TokenBucket(100, 500)
+        bucket.acquire(300)
+        self.assertEqual(self.clock.sleeps, [])
+        # 200 bytes are left, the other 200 take two seconds to refill
+        bucket.acquire(400)
+        self.assertEqual(self.clock.sleeps, [2.0])
+
+    def test_refill(self):
+        bucket = TokenBucket(100, 500)
+        bucket.acquire(500)
+        self.clock.now += 3
+        bucket.acquire(300)
+        self.assertEqual(self.clock.sleeps, [])
+        # The refill stops at the capacity
+        self.clock.now += 60
+        bucket.acquire(500)
+        bucket.acquire(100)
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+    def test_larger_than_capacity(self):
+        bucket = TokenBucket(100, 500)
+        bucket.acquire(100)
+        bucket.acquire(5000)
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()